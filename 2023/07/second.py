@@ -21,16 +21,33 @@ With the new joker rule, the total winnings in this example are 5905.
 
 Using the new joker rule, find the rank of every hand in your set. What are the new total winnings?
 """
-import pathlib
+import array
 import collections
+import functools
+import hashlib
+import heapq
+import itertools
+import mmap
+import operator
+import pathlib
+import struct
+import tempfile
+from typing import Iterator, Sequence
 from unittest import mock
 
+import numpy as np
 import pytest
 
 
 puzzle_file = pathlib.Path(__file__).parent / "puzzle.txt"
+score_table_file = pathlib.Path(__file__).parent / "second_scores.bin"
+
+MAP_LETTER_TO_VALUE = {"A": 14, "K": 13, "Q": 12, "T": 10, "J": 1}
 
-MAP_LETTER_TO_VALUE = {"A": 14, "K": 13, "Q": 12, "T": 10, "J": 0.5}
+CARDS = "J23456789TQKA"
+MAP_CARD_TO_INDEX = {card: idx for idx, card in enumerate(CARDS)}
+# main scores of each hand type, from high card up to five of a kind
+HAND_TYPES = [5, 7, 9, 11, 13, 17, 25]
 
 
 def hand_encode(cards: str) -> list[int]:
@@ -72,6 +89,136 @@ def test_compare_score_hand() -> None:
     assert score_hand("QQQQ2") > score_hand("JKKK2")
 
 
+def hand_index(cards: str) -> int:
+    index = 0
+    for card in cards:
+        index = index * 13 + MAP_CARD_TO_INDEX[card]
+    return index
+
+
+def test_hand_index() -> None:
+    assert hand_index("JJJJJ") == 0
+    assert hand_index("JJJJ2") == 1
+    assert hand_index("2JJJJ") == 13**4
+    assert hand_index("AAAAA") == 13**5 - 1
+
+
+@functools.cache
+def get_hand_type(sorted_cards: str) -> int:
+    main_score, _ = score_hand(sorted_cards)
+    return HAND_TYPES.index(main_score)
+
+
+def pack_score(cards: str) -> int:
+    """
+    Fold the result of `score_hand` into a single integer preserving its order.
+    """
+    hand_type = get_hand_type("".join(sorted(cards)))
+    encoded = hand_encode(cards)
+    second_score = sum(card * 15**exp for exp, card in enumerate(encoded[::-1]))
+    return hand_type * 15**5 + second_score
+
+
+def test_pack_score() -> None:
+    hands = ["32T3K", "T55J5", "KK677", "KTJJT", "QQQJA", "JKKK2", "QJJQ2", "JJJJJ"]
+    assert sorted(hands, key=pack_score) == sorted(hands, key=score_hand)
+
+
+def build_score_table() -> array.array[int]:
+    """
+    Packed score of every possible hand, indexed by `hand_index`.
+    """
+    return array.array(
+        "I",
+        (pack_score("".join(hand)) for hand in itertools.product(CARDS, repeat=5)),
+    )
+
+
+SCORE_TABLE_MAGIC = b"DAY7SCOR"
+# bump whenever `pack_score` changes the way it packs scores
+SCORE_TABLE_VERSION = 1
+# magic, version, digest of the cards and hand types the table was built from
+SCORE_TABLE_HEADER = struct.Struct("<8sQ16s")
+
+
+def score_table_tag() -> bytes:
+    digest = hashlib.sha256(repr((CARDS, HAND_TYPES)).encode()).digest()[:16]
+    return SCORE_TABLE_HEADER.pack(SCORE_TABLE_MAGIC, SCORE_TABLE_VERSION, digest)
+
+
+def save_score_table(path: pathlib.Path) -> None:
+    """
+    Write through a temporary file of our own, so that concurrent writers each
+    replace the table with a complete one.
+    """
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+    tmp_path = pathlib.Path(tmp_name)
+    try:
+        with open(fd, "wb") as f:
+            f.write(score_table_tag())
+            build_score_table().tofile(f)
+        tmp_path.replace(path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def read_score_table(path: pathlib.Path) -> memoryview | None:
+    """
+    Map a saved table, or return None if it is missing, truncated or was built
+    by another version of the scoring.
+    """
+    expected_size = SCORE_TABLE_HEADER.size + 4 * 13**5
+    if not path.exists() or path.stat().st_size != expected_size:
+        return None
+    with path.open("rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mapped[: SCORE_TABLE_HEADER.size] != score_table_tag():
+        mapped.close()
+        return None
+    # the size check above guarantees 13**5 entries
+    return memoryview(mapped)[SCORE_TABLE_HEADER.size :].cast("I")
+
+
+def load_score_table(path: pathlib.Path = score_table_file) -> memoryview:
+    table = read_score_table(path)
+    if table is None:
+        save_score_table(path)
+        table = read_score_table(path)
+    if table is None:
+        raise RuntimeError(f"Could not load the score table: {path}")
+    return table
+
+
+@pytest.fixture(scope="module")
+def score_table(tmp_path_factory: pytest.TempPathFactory) -> memoryview:
+    return load_score_table(tmp_path_factory.mktemp("table") / "second_scores.bin")
+
+
+def lookup_score(table: Sequence[int], cards: str) -> int:
+    return table[hand_index(cards)]
+
+
+def test_lookup_score(score_table: memoryview) -> None:
+    assert len(score_table) == 13**5
+    for hand in ["32T3K", "T55J5", "KK677", "KTJJT", "QQQJA", "JJJJJ", "AAAAA"]:
+        assert lookup_score(score_table, hand) == pack_score(hand)
+
+
+def test_load_score_table(tmp_path: pathlib.Path) -> None:
+    path = tmp_path / "second_scores.bin"
+    path.write_bytes(score_table_tag() + bytes(100))
+    assert len(load_score_table(path)) == 13**5
+    assert [file.name for file in tmp_path.iterdir()] == [path.name]
+
+    stale = bytearray(path.read_bytes())
+    stale[8] += 1
+    path.write_bytes(stale)
+    table = load_score_table(path)
+    assert lookup_score(table, "KK677") == pack_score("KK677")
+    assert read_score_table(path) is not None
+
+
 def parse_puzzle(lines: list[str]) -> list[tuple[str, int]]:
     result = []
     for line in lines:
@@ -105,9 +252,336 @@ def test_play_game(puzzle: list[str]) -> None:
     assert play_game(puzzle) == 5905
 
 
+def play_game_with_table(puzzle: list[str], table: Sequence[int]) -> int:
+    parsed_hands = parse_puzzle(puzzle)
+    ordered = sorted(parsed_hands, key=lambda t: lookup_score(table, t[0]))
+    return sum(rank * card[1] for rank, card in enumerate(ordered, start=1))
+
+
+def test_play_game_with_table(puzzle: list[str], score_table: memoryview) -> None:
+    assert play_game_with_table(puzzle, score_table) == 5905
+
+
+def radix_sort_order(keys: Sequence[int], bits: int = 12) -> array.array[int]:
+    """
+    Indices of `keys` in ascending key order, using a stable LSD radix sort.
+    """
+    mask = (1 << bits) - 1
+    order = array.array("L", range(len(keys)))
+    max_key = max(keys, default=0)
+    shift = 0
+    while max_key >> shift:
+        counts = [0] * (mask + 1)
+        for idx in order:
+            counts[(keys[idx] >> shift) & mask] += 1
+        starts = [0, *itertools.accumulate(counts)]
+        sorted_order = array.array("L", order)
+        for idx in order:
+            digit = (keys[idx] >> shift) & mask
+            sorted_order[starts[digit]] = idx
+            starts[digit] += 1
+        order = sorted_order
+        shift += bits
+    return order
+
+
+@pytest.mark.parametrize("bits", [1, 4, 12])
+def test_radix_sort_order(bits: int) -> None:
+    keys = [7 * 15**5 - 1, 0, 42, 15**5, 42, 3, 123456]
+    order = radix_sort_order(keys, bits)
+    assert [keys[idx] for idx in order] == sorted(keys)
+    assert list(order) == sorted(range(len(keys)), key=keys.__getitem__)
+    assert list(radix_sort_order([])) == []
+
+
+def rank_winnings(keys: Sequence[int], bids: Sequence[int]) -> int:
+    order = radix_sort_order(keys)
+    return sum(rank * bids[idx] for rank, idx in enumerate(order, start=1))
+
+
+def play_game_radix(puzzle: list[str], table: Sequence[int]) -> int:
+    keys = array.array("I")
+    bids = array.array("L")
+    for hand, bid in parse_puzzle(puzzle):
+        keys.append(lookup_score(table, hand))
+        bids.append(bid)
+    return rank_winnings(keys, bids)
+
+
+def test_play_game_radix(puzzle: list[str], score_table: memoryview) -> None:
+    assert play_game_radix(puzzle, score_table) == 5905
+
+
+class FenwickTree:
+    def __init__(self, size: int) -> None:
+        self.tree = array.array("q", [0]) * (size + 1)
+
+    def add(self, idx: int, value: int) -> None:
+        idx += 1
+        while idx < len(self.tree):
+            self.tree[idx] += value
+            idx += idx & -idx
+
+    def prefix_sum(self, idx: int) -> int:
+        """
+        Sum of the values stored at positions strictly below `idx`.
+        """
+        result = 0
+        while idx > 0:
+            result += self.tree[idx]
+            idx -= idx & -idx
+        return result
+
+    def append(self, value: int) -> None:
+        """
+        Grow the tree by one position holding `value`.
+        """
+        idx = len(self.tree)
+        covered = self.prefix_sum(idx - 1) - self.prefix_sum(idx - (idx & -idx))
+        self.tree.append(covered + value)
+
+
+def test_fenwick_tree() -> None:
+    tree = FenwickTree(10)
+    for idx, value in [(0, 5), (3, 2), (9, 7), (3, 1)]:
+        tree.add(idx, value)
+    expected = [0, 5, 5, 5, 8, 8, 8, 8, 8, 8, 15]
+    assert [tree.prefix_sum(idx) for idx in range(11)] == expected
+
+    grown = FenwickTree(0)
+    for value in [5, 0, 0, 3, 0, 0, 0, 0, 0, 7]:
+        grown.append(value)
+    assert [grown.prefix_sum(idx) for idx in range(11)] == expected
+    grown.add(4, 2)
+    assert grown.prefix_sum(10) == 17
+
+
+def strength_slots(table: Sequence[int]) -> array.array[int]:
+    """
+    Position of every hand, indexed by `hand_index`, once all hands are sorted.
+    """
+    slots = array.array("L", [0]) * len(table)
+    for slot, idx in enumerate(radix_sort_order(table)):
+        slots[idx] = slot
+    return slots
+
+
+class EqualHands:
+    """
+    Hands of one strength slot in arrival order. Removed hands stay in the trees
+    with a weight of zero, until the slot empties and is dropped.
+    """
+
+    def __init__(self) -> None:
+        self.counts = FenwickTree(0)
+        self.bid_sums = FenwickTree(0)
+        self.arrivals: dict[int, collections.deque[int]] = {}
+        self.size = 0
+        self.total_bids = 0
+
+    def append(self, bid: int) -> None:
+        self.arrivals.setdefault(bid, collections.deque()).append(
+            len(self.counts.tree) - 1
+        )
+        self.counts.append(1)
+        self.bid_sums.append(bid)
+        self.size += 1
+        self.total_bids += bid
+
+    def remove_first(self, bid: int) -> tuple[int, int]:
+        """
+        Remove the first hand that arrived with `bid`, and return the number of
+        equal hands before it and the sum of the bids of those after it.
+        """
+        arrival = self.arrivals[bid].popleft()
+        if not self.arrivals[bid]:
+            del self.arrivals[bid]
+        earlier = self.counts.prefix_sum(arrival)
+        later_bids = self.total_bids - self.bid_sums.prefix_sum(arrival + 1)
+        self.counts.add(arrival, -1)
+        self.bid_sums.add(arrival, -bid)
+        self.size -= 1
+        self.total_bids -= bid
+        return earlier, later_bids
+
+
+class HandRanker:
+    """
+    Keeps the total winnings of a changing set of hands up to date. Equal hands
+    rank in arrival order, as with the stable sort of `play_game`.
+    """
+
+    def __init__(self, table: Sequence[int]) -> None:
+        self.slots = strength_slots(table)
+        self.counts = FenwickTree(len(table))
+        self.bid_sums = FenwickTree(len(table))
+        self.equal_hands: dict[int, EqualHands] = {}
+        self.total_bids = 0
+        self.winnings = 0
+
+    def insert(self, hand: str, bid: int) -> int:
+        slot = self.slots[hand_index(hand)]
+        rank = self.counts.prefix_sum(slot + 1) + 1
+        stronger_bids = self.total_bids - self.bid_sums.prefix_sum(slot + 1)
+        self.winnings += rank * bid + stronger_bids
+        self.counts.add(slot, 1)
+        self.bid_sums.add(slot, bid)
+        self.equal_hands.setdefault(slot, EqualHands()).append(bid)
+        self.total_bids += bid
+        return self.winnings
+
+    def remove(self, hand: str, bid: int) -> int:
+        slot = self.slots[hand_index(hand)]
+        equal_hands = self.equal_hands.get(slot)
+        if equal_hands is None or bid not in equal_hands.arrivals:
+            raise ValueError(f"Hand not ranked with bid {bid}: {hand}")
+        earlier, later_bids = equal_hands.remove_first(bid)
+        if not equal_hands.size:
+            del self.equal_hands[slot]
+        rank = self.counts.prefix_sum(slot) + earlier + 1
+        stronger_bids = self.total_bids - self.bid_sums.prefix_sum(slot + 1)
+        self.winnings -= rank * bid + later_bids + stronger_bids
+        self.counts.add(slot, -1)
+        self.bid_sums.add(slot, -bid)
+        self.total_bids -= bid
+        return self.winnings
+
+
+def test_hand_ranker(puzzle: list[str], score_table: memoryview) -> None:
+    ranker = HandRanker(score_table)
+    for end, (hand, bid) in enumerate(parse_puzzle(puzzle), start=1):
+        assert ranker.insert(hand, bid) == play_game(puzzle[:end])
+    assert ranker.winnings == 5905
+
+    hand, bid = parse_puzzle(puzzle)[1]
+    assert ranker.remove(hand, bid) == play_game(puzzle[:1] + puzzle[2:])
+    assert ranker.insert(hand, bid) == play_game(puzzle[:1] + puzzle[2:] + puzzle[1:2])
+
+    with pytest.raises(ValueError):
+        ranker.remove(hand, bid + 1)
+
+
+def test_hand_ranker_repeated_hands(score_table: memoryview) -> None:
+    puzzle = ["32T3K 5", "32T3K 7", "KK677 28", "32T3K 2", "KK677 3", "32T3K 7"]
+    ranker = HandRanker(score_table)
+    for end, (hand, bid) in enumerate(parse_puzzle(puzzle), start=1):
+        assert ranker.insert(hand, bid) == play_game(puzzle[:end])
+
+    for line in ["32T3K 7", "KK677 28", "32T3K 5"]:
+        hand, bid = parse_puzzle([line])[0]
+        puzzle.remove(line)
+        assert ranker.remove(hand, bid) == play_game(puzzle)
+
+
+MAP_BYTE_TO_VALUE = np.zeros(256, dtype=np.uint8)
+MAP_BYTE_TO_VALUE[np.frombuffer(CARDS.encode(), dtype=np.uint8)] = hand_encode(CARDS)
+
+
+def encode_hands_bulk(hands: np.ndarray) -> np.ndarray:
+    """
+    (N, 5) matrix of card values for an array of hand strings.
+    """
+    return MAP_BYTE_TO_VALUE[hands.astype("S5").view(np.uint8).reshape(-1, 5)]
+
+
+def score_hands_bulk(hands: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorized `score_hand`, with the tie break folded into a single integer.
+    """
+    encoded = encode_hands_bulk(hands)
+    offsets = np.arange(len(encoded))[:, None] * 15
+    counts = np.bincount(
+        (offsets + encoded).ravel(), minlength=15 * len(encoded)
+    ).reshape(-1, 15)
+    jokers = counts[:, MAP_LETTER_TO_VALUE["J"]].copy()
+    counts[:, MAP_LETTER_TO_VALUE["J"]] = 0
+    largest = counts.max(axis=1)
+    main_scores = (counts**2).sum(axis=1) - largest**2 + (largest + jokers) ** 2
+    second_scores = encoded.astype(np.int64) @ 15 ** np.arange(4, -1, -1)
+    return main_scores, second_scores
+
+
+def test_score_hands_bulk() -> None:
+    hands = ["32T3K", "T55J5", "KK677", "KTJJT", "QQQJA", "JJJJJ", "AAAA2", "23456"]
+    main_scores, second_scores = score_hands_bulk(np.array(hands))
+    assert list(main_scores) == [score_hand(hand)[0] for hand in hands]
+    assert list(second_scores) == [pack_score(hand) % 15**5 for hand in hands]
+
+
+def play_game_bulk(puzzle: list[str]) -> int:
+    if not puzzle:
+        return 0
+    hands, _, bids = np.char.partition(np.array(puzzle), " ").T
+    main_scores, second_scores = score_hands_bulk(hands)
+    order = np.lexsort((second_scores, main_scores))
+    ranks = np.arange(1, len(order) + 1)
+    return int(ranks @ bids.astype(np.int64)[order])
+
+
+def test_play_game_bulk(puzzle: list[str]) -> None:
+    assert play_game_bulk(puzzle) == 5905
+    assert play_game_bulk([]) == 0
+
+
+RUN_RECORD = struct.Struct("<II")
+
+
+def write_sorted_run(
+    hands: list[tuple[str, int]], table: Sequence[int], path: pathlib.Path
+) -> None:
+    records = sorted(
+        ((lookup_score(table, hand), bid) for hand, bid in hands),
+        key=operator.itemgetter(0),
+    )
+    with path.open("wb") as f:
+        for record in records:
+            f.write(RUN_RECORD.pack(*record))
+
+
+def read_sorted_run(
+    path: pathlib.Path, buffer_size: int = 4096
+) -> Iterator[tuple[int, int]]:
+    with path.open("rb") as f:
+        while chunk := f.read(RUN_RECORD.size * buffer_size):
+            yield from RUN_RECORD.iter_unpack(chunk)
+
+
+def play_game_external(
+    path: pathlib.Path, table: Sequence[int], chunk_size: int = 1_000_000
+) -> int:
+    """
+    Rank the hands of a file that may not fit in memory.
+
+    At most `chunk_size` hands are held at once: each chunk is sorted into a
+    temporary run file, and the runs are merged back while summing the winnings.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir, path.open() as f:
+        runs: list[pathlib.Path] = []
+        for chunk in itertools.batched(f, chunk_size):
+            run = pathlib.Path(tmp_dir) / f"run-{len(runs)}.bin"
+            write_sorted_run(parse_puzzle([line.strip() for line in chunk]), table, run)
+            runs.append(run)
+        merged = heapq.merge(
+            *(read_sorted_run(run) for run in runs), key=operator.itemgetter(0)
+        )
+        return sum(rank * bid for rank, (_, bid) in enumerate(merged, start=1))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 5, 10])
+def test_play_game_external(
+    puzzle: list[str],
+    score_table: memoryview,
+    tmp_path: pathlib.Path,
+    chunk_size: int,
+) -> None:
+    path = tmp_path / "puzzle.txt"
+    path.write_text("\n".join(puzzle) + "\n")
+    assert play_game_external(path, score_table, chunk_size) == 5905
+
+
 def main() -> None:
     puzzle = puzzle_file.read_text().splitlines()
-    print(play_game(puzzle))
+    print(play_game_radix(puzzle, load_score_table()))
 
 
 if __name__ == "__main__":
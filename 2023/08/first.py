@@ -32,9 +32,17 @@ ZZZ = (ZZZ, ZZZ)
 Starting at AAA, follow the left/right instructions. How many steps are required to reach ZZZ?
 
 """
+import array
+import hashlib
 import itertools
+import mmap
 import pathlib
 import re
+import struct
+import tempfile
+from typing import Callable, NamedTuple
+
+import pytest
 
 
 puzzle_file = pathlib.Path(__file__).parent / "puzzle.txt"
@@ -57,6 +65,43 @@ def parse_puzzle(puzzle: str) -> tuple[str, dict[str, tuple[str, str]]]:
     return directions, network_dict
 
 
+class CompiledNetwork(NamedTuple):
+    """
+    Network with nodes replaced by dense integer ids.
+
+    `directions` holds 0 for L and 1 for R, so that the successor of `node` is
+    `successors[direction][node]`. `ids` maps every name back to its id.
+    """
+
+    names: list[str]
+    left: array.array[int] | memoryview
+    right: array.array[int] | memoryview
+    directions: bytes | memoryview
+    ids: dict[str, int]
+
+    @property
+    def successors(
+        self,
+    ) -> tuple[array.array[int] | memoryview, array.array[int] | memoryview]:
+        return self.left, self.right
+
+    def node_id(self, name: str) -> int:
+        return self.ids[name]
+
+
+def compile_network(
+    directions: str, network: dict[str, tuple[str, str]]
+) -> CompiledNetwork:
+    names = list(network)
+    ids = {name: idx for idx, name in enumerate(names)}
+    left = array.array("q", (ids[left] for left, _ in network.values()))
+    right = array.array("q", (ids[right] for _, right in network.values()))
+    if invalid := set(directions) - {"L", "R"}:
+        raise ValueError(f"Invalid direction: {invalid.pop()}")
+    compiled_directions = bytes(direction == "R" for direction in directions)
+    return CompiledNetwork(names, left, right, compiled_directions, ids)
+
+
 def play_game(puzzle: str) -> int:
     directions, network = parse_puzzle(puzzle)
 
@@ -75,6 +120,254 @@ def play_game(puzzle: str) -> int:
     raise RuntimeError("Unreachable")
 
 
+def play_game_compiled(puzzle: str) -> int:
+    network = compile_network(*parse_puzzle(puzzle))
+    successors = network.successors
+
+    current_node = network.node_id("AAA")
+    goal = network.node_id("ZZZ")
+    for counter, direction in enumerate(itertools.cycle(network.directions)):
+        if current_node == goal:
+            return counter
+        current_node = successors[direction][current_node]
+    raise RuntimeError("Unreachable")
+
+
+def walk_to_goal(network: CompiledNetwork, start: int, goal: int) -> int | None:
+    """
+    Steps from `start` to `goal`, or None once every (node, direction index)
+    state has had its chance without reaching it.
+    """
+    successors = network.successors
+    max_steps = len(network.names) * len(network.directions)
+    node = start
+    for counter, direction in enumerate(itertools.cycle(network.directions)):
+        if node == goal:
+            return counter
+        if counter >= max_steps:
+            return None
+        node = successors[direction][node]
+    raise RuntimeError("Unreachable")
+
+
+class JumpTable:
+    """
+    Binary lifting over whole passes of the direction string.
+
+    `jumps[level][node]` is where a walker starting on `node` stands after
+    `2**level` passes, and `first_hits[level][node]` is the first step within
+    those passes at which it stands on `goal`, or -1 if it never does.
+    """
+
+    def __init__(self, network: CompiledNetwork, goal: int) -> None:
+        self.network = network
+        self.period = len(network.directions)
+        successors = network.successors
+
+        jump = array.array("q", [0]) * len(network.names)
+        first_hit = array.array("q", [-1]) * len(network.names)
+        for start in range(len(network.names)):
+            node = start
+            for step, direction in enumerate(network.directions):
+                if node == goal and first_hit[start] < 0:
+                    first_hit[start] = step
+                node = successors[direction][node]
+            jump[start] = node
+        self.jumps = [jump]
+        self.first_hits = [first_hit]
+
+    def _ensure_levels(self, count: int) -> None:
+        while len(self.jumps) < count:
+            jump, first_hit = self.jumps[-1], self.first_hits[-1]
+            span = self.period << (len(self.jumps) - 1)
+            next_jump = array.array("q", jump)
+            next_first_hit = array.array("q", first_hit)
+            for node, middle in enumerate(jump):
+                next_jump[node] = jump[middle]
+                if first_hit[node] < 0 and first_hit[middle] >= 0:
+                    next_first_hit[node] = span + first_hit[middle]
+            self.jumps.append(next_jump)
+            self.first_hits.append(next_first_hit)
+
+    def position_after(self, node: int, steps: int) -> int:
+        passes, remainder = divmod(steps, self.period)
+        self._ensure_levels(passes.bit_length())
+        for level in range(passes.bit_length()):
+            if passes >> level & 1:
+                node = self.jumps[level][node]
+        successors = self.network.successors
+        for direction in self.network.directions[:remainder]:
+            node = successors[direction][node]
+        return node
+
+    def first_goal_hit(self, node: int) -> int | None:
+        # the passes end up looping over at most every node, so any hit happens
+        # within the first len(names) passes
+        self._ensure_levels(len(self.network.names).bit_length())
+        steps = 0
+        for level in reversed(range(len(self.jumps))):
+            if self.first_hits[level][node] < 0:
+                node = self.jumps[level][node]
+                steps += self.period << level
+        if self.first_hits[0][node] < 0:
+            return None
+        return steps + self.first_hits[0][node]
+
+
+def play_game_jump(puzzle: str) -> int:
+    network = compile_network(*parse_puzzle(puzzle))
+    jump_table = JumpTable(network, network.node_id("ZZZ"))
+    steps = jump_table.first_goal_hit(network.node_id("AAA"))
+    if steps is None:
+        raise ValueError("ZZZ is never reached from AAA")
+    return steps
+
+
+def is_goal_node(name: str) -> bool:
+    return name == "ZZZ"
+
+
+class StepsToGoal:
+    """
+    Steps from every (node, direction index) state to the first goal node.
+
+    Each state is walked at most once: a walk stops on a state whose distance
+    is already known, and the distances are then filled backwards along it.
+    """
+
+    UNREACHABLE = -1
+    _ON_PATH = -2
+    _UNKNOWN = -3
+
+    def __init__(
+        self, network: CompiledNetwork, is_goal: Callable[[str], bool] = is_goal_node
+    ) -> None:
+        self.ids = network.ids
+        nodes, period = len(network.names), len(network.directions)
+        goals = [is_goal(name) for name in network.names]
+        successors = network.successors
+
+        self.steps = array.array("q", [self._UNKNOWN]) * (nodes * period)
+        for first_state in range(len(self.steps)):
+            path = []
+            state = first_state
+            while self.steps[state] == self._UNKNOWN:
+                idx, node = divmod(state, nodes)
+                if goals[node]:
+                    self.steps[state] = 0
+                    break
+                self.steps[state] = self._ON_PATH
+                path.append(state)
+                next_node = successors[network.directions[idx]][node]
+                state = (idx + 1) % period * nodes + next_node
+
+            distance = max(self.steps[state], self.UNREACHABLE)
+            for state in reversed(path):
+                if distance != self.UNREACHABLE:
+                    distance += 1
+                self.steps[state] = distance
+
+    def from_node(self, name: str, direction_index: int = 0) -> int | None:
+        steps = self.steps[direction_index * len(self.ids) + self.ids[name]]
+        return None if steps == self.UNREACHABLE else steps
+
+
+CACHE_MAGIC = b"DAY8NET1"
+# magic, number of nodes, number of directions, size of the encoded names
+CACHE_HEADER = struct.Struct("<8sQQQ")
+
+
+def network_cache_file(puzzle: str, directory: pathlib.Path) -> pathlib.Path:
+    digest = hashlib.sha256(puzzle.encode()).hexdigest()[:16]
+    return directory / f"network-{digest}.bin"
+
+
+def find_z_mask(network: CompiledNetwork) -> bytes:
+    """
+    Goal mask of the ghosts of part two, cached along with the network so that
+    both parts share the same file.
+    """
+    return bytes(name.endswith("Z") for name in network.names)
+
+
+def save_compiled_network(path: pathlib.Path, network: CompiledNetwork) -> None:
+    """
+    Store the network and its Z-mask, the ids arrays first so they stay aligned.
+    Every writer goes through its own temporary file.
+    """
+    names = "\n".join(network.names).encode()
+    z_mask = find_z_mask(network)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+    tmp_path = pathlib.Path(tmp_name)
+    with open(fd, "wb") as f:
+        f.write(
+            CACHE_HEADER.pack(
+                CACHE_MAGIC, len(network.names), len(network.directions), len(names)
+            )
+        )
+        f.write(memoryview(network.left).cast("B"))
+        f.write(memoryview(network.right).cast("B"))
+        f.write(bytes(network.directions))
+        f.write(z_mask)
+        f.write(names)
+    tmp_path.replace(path)
+
+
+def load_compiled_network(
+    path: pathlib.Path,
+) -> tuple[CompiledNetwork, memoryview] | None:
+    """
+    Map a saved network, or return None if it is missing, truncated or not a
+    compiled network.
+    """
+    if not path.exists() or path.stat().st_size < CACHE_HEADER.size:
+        return None
+    with path.open("rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, nodes, period, names_size = CACHE_HEADER.unpack_from(mapped)
+    expected_size = CACHE_HEADER.size + 17 * nodes + period + names_size
+    if magic != CACHE_MAGIC or len(mapped) != expected_size:
+        mapped.close()
+        return None
+    buffer = memoryview(mapped)
+    offset = CACHE_HEADER.size
+    left = buffer[offset : offset + 8 * nodes].cast("q")
+    offset += 8 * nodes
+    right = buffer[offset : offset + 8 * nodes].cast("q")
+    offset += 8 * nodes
+    directions = buffer[offset : offset + period]
+    offset += period
+    z_mask = buffer[offset : offset + nodes]
+    offset += nodes
+    names = bytes(buffer[offset : offset + names_size]).decode().split("\n")
+    ids = {name: idx for idx, name in enumerate(names)}
+    return CompiledNetwork(names, left, right, directions, ids), z_mask
+
+
+def load_network(
+    puzzle: str, directory: pathlib.Path = puzzle_file.parent
+) -> tuple[CompiledNetwork, memoryview]:
+    """
+    Compiled network of the puzzle, cached on disk by the hash of its contents.
+    """
+    path = network_cache_file(puzzle, directory)
+    loaded = load_compiled_network(path)
+    if loaded is None:
+        save_compiled_network(path, compile_network(*parse_puzzle(puzzle)))
+        loaded = load_compiled_network(path)
+    if loaded is None:
+        raise RuntimeError(f"Could not load the compiled network: {path}")
+    return loaded
+
+
+def play_game_cached(puzzle: str, directory: pathlib.Path = puzzle_file.parent) -> int:
+    network, _ = load_network(puzzle, directory)
+    steps = walk_to_goal(network, network.node_id("AAA"), network.node_id("ZZZ"))
+    if steps is None:
+        raise ValueError("ZZZ is never reached from AAA")
+    return steps
+
+
 PUZZLE_1 = """
 RL
 
@@ -130,9 +423,127 @@ def test_play_game_2() -> None:
     assert play_game(PUZZLE_2) == 6
 
 
+def test_compile_network_2() -> None:
+    network = compile_network(*parse_puzzle(PUZZLE_2))
+
+    assert network.names == ["AAA", "BBB", "ZZZ"]
+    assert list(network.left) == [1, 0, 2]
+    assert list(network.right) == [1, 2, 2]
+    assert list(network.directions) == [0, 0, 1]
+    assert network.node_id("ZZZ") == 2
+
+
+def test_compile_network_invalid_direction() -> None:
+    with pytest.raises(ValueError):
+        compile_network("LRX", {"AAA": ("AAA", "AAA")})
+
+
+def test_play_game_compiled() -> None:
+    assert play_game_compiled(PUZZLE_1) == 2
+    assert play_game_compiled(PUZZLE_2) == 6
+
+
+def test_jump_table_position_after() -> None:
+    network = compile_network(*parse_puzzle(PUZZLE_2))
+    jump_table = JumpTable(network, network.node_id("ZZZ"))
+    successors = network.successors
+
+    for start in range(len(network.names)):
+        node = start
+        for steps, direction in enumerate(
+            itertools.islice(itertools.cycle(network.directions), 50)
+        ):
+            assert jump_table.position_after(start, steps) == node
+            node = successors[direction][node]
+
+
+def test_jump_table_first_goal_hit() -> None:
+    network = compile_network(*parse_puzzle(PUZZLE_2))
+    jump_table = JumpTable(network, network.node_id("ZZZ"))
+
+    assert jump_table.first_goal_hit(network.node_id("AAA")) == 6
+    assert jump_table.first_goal_hit(network.node_id("BBB")) == 3
+    assert jump_table.first_goal_hit(network.node_id("ZZZ")) == 0
+
+    network = compile_network("LR", {"AAA": ("BBB", "AAA"), "BBB": ("BBB", "AAA")})
+    jump_table = JumpTable(network, network.node_id("BBB"))
+    assert jump_table.first_goal_hit(network.node_id("AAA")) == 1
+    jump_table = JumpTable(network, network.node_id("AAA"))
+    assert jump_table.first_goal_hit(network.node_id("BBB")) == 2
+
+    chain = {f"N{idx:02}": (f"N{idx + 1:02}", f"N{idx:02}") for idx in range(20)}
+    chain["N20"] = ("N20", "N20")
+    network = compile_network("LLL", chain)
+    jump_table = JumpTable(network, network.node_id("N19"))
+    assert jump_table.first_goal_hit(network.node_id("N00")) == 19
+    assert jump_table.first_goal_hit(network.node_id("N20")) is None
+
+    network = compile_network("LR", {"AAA": ("AAA", "AAA"), "BBB": ("AAA", "BBB")})
+    jump_table = JumpTable(network, network.node_id("BBB"))
+    assert jump_table.first_goal_hit(network.node_id("AAA")) is None
+
+
+def test_play_game_jump() -> None:
+    assert play_game_jump(PUZZLE_1) == 2
+    assert play_game_jump(PUZZLE_2) == 6
+
+
+def test_steps_to_goal() -> None:
+    steps_to_goal = StepsToGoal(compile_network(*parse_puzzle(PUZZLE_2)))
+
+    assert steps_to_goal.from_node("AAA") == 6
+    assert steps_to_goal.from_node("BBB") == 3
+    assert steps_to_goal.from_node("BBB", direction_index=2) == 1
+    assert steps_to_goal.from_node("ZZZ", direction_index=1) == 0
+
+    steps_to_goal = StepsToGoal(
+        compile_network(*parse_puzzle(PUZZLE_1)), lambda name: name == "CCC"
+    )
+    assert steps_to_goal.from_node("AAA") == 1
+    assert steps_to_goal.from_node("BBB") is None
+
+
+def test_load_network(tmp_path: pathlib.Path) -> None:
+    compiled = compile_network(*parse_puzzle(PUZZLE_2))
+    network, z_mask = load_network(PUZZLE_2, tmp_path)
+
+    assert network.names == compiled.names
+    assert network.ids == compiled.ids
+    assert list(network.left) == list(compiled.left)
+    assert list(network.right) == list(compiled.right)
+    assert bytes(network.directions) == bytes(compiled.directions)
+    assert bytes(z_mask) == find_z_mask(compiled)
+    assert [path.name for path in tmp_path.iterdir()] == [
+        network_cache_file(PUZZLE_2, tmp_path).name
+    ]
+
+    load_network(PUZZLE_2, tmp_path)
+    path = network_cache_file(PUZZLE_2, tmp_path)
+    path.write_bytes(path.read_bytes()[:-1])
+    assert load_compiled_network(path) is None
+    assert list(load_network(PUZZLE_2, tmp_path)[0].left) == list(compiled.left)
+    path.write_bytes(b"not a network")
+    assert load_compiled_network(path) is None
+    assert load_network(PUZZLE_2, tmp_path)[0].names == compiled.names
+    load_network(PUZZLE_1, tmp_path)
+    assert len(list(tmp_path.iterdir())) == 2
+
+
+def test_walk_to_goal() -> None:
+    network = compile_network(*parse_puzzle(PUZZLE_2))
+    assert walk_to_goal(network, network.node_id("AAA"), network.node_id("ZZZ")) == 6
+    assert walk_to_goal(network, network.node_id("ZZZ"), network.node_id("ZZZ")) == 0
+    assert walk_to_goal(network, network.node_id("ZZZ"), network.node_id("AAA")) is None
+
+
+def test_play_game_cached(tmp_path: pathlib.Path) -> None:
+    assert play_game_cached(PUZZLE_2, tmp_path) == 6
+    assert play_game_cached(PUZZLE_2, tmp_path) == 6
+
+
 def main() -> None:
     puzzle = puzzle_file.read_text()
-    print(play_game(puzzle))
+    print(play_game_cached(puzzle))
 
 
 if __name__ == "__main__":
@@ -69,9 +69,21 @@ So, in this example, you end up entirely on nodes that end in Z after 6 steps.
 
 Simultaneously start on every node that ends with A. How many steps does it take before you're only on nodes that end with Z?
 """
+import array
+import concurrent.futures
+import hashlib
 import itertools
+import math
+import mmap
 import pathlib
 import re
+import struct
+import tempfile
+from multiprocessing import shared_memory
+from typing import Callable, NamedTuple, Sequence
+
+import numpy as np
+import pytest
 
 
 puzzle_file = pathlib.Path(__file__).parent / "puzzle.txt"
@@ -94,36 +106,432 @@ def parse_puzzle(puzzle: str) -> tuple[str, dict[str, tuple[str, str]]]:
     return directions, network_dict
 
 
+class CompiledNetwork(NamedTuple):
+    """
+    Network with nodes replaced by dense integer ids.
+
+    `directions` holds 0 for L and 1 for R, so that the successor of `node` is
+    `successors[direction][node]`. `ids` maps every name back to its id.
+    """
+
+    names: list[str]
+    left: array.array[int] | memoryview
+    right: array.array[int] | memoryview
+    directions: bytes | memoryview
+    ids: dict[str, int]
+
+    @property
+    def successors(
+        self,
+    ) -> tuple[array.array[int] | memoryview, array.array[int] | memoryview]:
+        return self.left, self.right
+
+    def node_id(self, name: str) -> int:
+        return self.ids[name]
+
+
+def compile_network(
+    directions: str, network: dict[str, tuple[str, str]]
+) -> CompiledNetwork:
+    names = list(network)
+    ids = {name: idx for idx, name in enumerate(names)}
+    left = array.array("q", (ids[left] for left, _ in network.values()))
+    right = array.array("q", (ids[right] for _, right in network.values()))
+    if invalid := set(directions) - {"L", "R"}:
+        raise ValueError(f"Invalid direction: {invalid.pop()}")
+    compiled_directions = bytes(direction == "R" for direction in directions)
+    return CompiledNetwork(names, left, right, compiled_directions, ids)
+
+
 def find_starting_nodes(network: dict[str, tuple[str, str]]) -> list[str]:
     return [node for node in network if node.endswith("A")]
 
 
-def play_game(puzzle: str) -> int:
+def is_goal_node(name: str) -> bool:
+    return name.endswith("Z")
+
+
+def find_goal_mask(network: CompiledNetwork) -> bytes:
+    return bytes(is_goal_node(name) for name in network.names)
+
+
+def play_game_compiled(puzzle: str) -> int:
     directions, network = parse_puzzle(puzzle)
+    compiled = compile_network(directions, network)
+    successors = compiled.successors
+    goals = find_goal_mask(compiled)
 
-    current_nodes = find_starting_nodes(network)
-    print(current_nodes)
-    input()
-    for counter, direction in enumerate(itertools.cycle(directions)):
-        new_nodes = []
-        for node in current_nodes:
-            left, right = network[node]
-            if direction == "L":
-                new_nodes.append(left)
-            elif direction == "R":
-                new_nodes.append(right)
-            else:
-                raise ValueError(f"Invalid direction: {direction}")
-        if all(node.endswith("Z") for node in current_nodes):
+    current_nodes = [compiled.node_id(node) for node in find_starting_nodes(network)]
+    for counter, direction in enumerate(itertools.cycle(compiled.directions)):
+        if all(goals[node] for node in current_nodes):
             return counter
-        if any(node.endswith("Z") for node in current_nodes):
-            print(
-                counter, [node if node.endswith("Z") else " " for node in current_nodes]
-            )
-        current_nodes = new_nodes
+        current_nodes = [successors[direction][node] for node in current_nodes]
     raise RuntimeError("Unreachable")
 
 
+class GhostCycle(NamedTuple):
+    """
+    Walk of a single ghost over the (node, direction index) states.
+
+    The ghost enters its cycle after `offset` steps and repeats it every
+    `length` steps. `hits` lists the steps before `offset + length` at which the
+    ghost stands on a Z node.
+    """
+
+    offset: int
+    length: int
+    hits: list[int]
+
+    def is_hit(self, step: int) -> bool:
+        if step >= self.offset + self.length:
+            step = self.offset + (step - self.offset) % self.length
+        return step in self.hits
+
+
+def find_ghost_cycle(
+    network: CompiledNetwork, goals: Sequence[int], start: int
+) -> GhostCycle:
+    period = len(network.directions)
+    successors = network.successors
+    directions = network.directions
+
+    def advance(state: tuple[int, int]) -> tuple[int, int]:
+        node, idx = state
+        return successors[directions[idx]][node], (idx + 1) % period
+
+    # Brent's cycle detection, which needs no memory of the visited states
+    power = length = 1
+    tortoise, hare = (start, 0), advance((start, 0))
+    while tortoise != hare:
+        if power == length:
+            tortoise = hare
+            power *= 2
+            length = 0
+        hare = advance(hare)
+        length += 1
+
+    tortoise = hare = (start, 0)
+    for _ in range(length):
+        hare = advance(hare)
+    offset = 0
+    while tortoise != hare:
+        tortoise, hare = advance(tortoise), advance(hare)
+        offset += 1
+
+    hits = []
+    state = (start, 0)
+    for step in range(offset + length):
+        if goals[state[0]]:
+            hits.append(step)
+        state = advance(state)
+    return GhostCycle(offset, length, hits)
+
+
+def solve_congruences(
+    remainder_a: int, modulus_a: int, remainder_b: int, modulus_b: int
+) -> tuple[int, int] | None:
+    """
+    Generalized CRT, for moduli that need not be coprime.
+
+    >>> solve_congruences(1, 3, 3, 5)
+    (13, 15)
+    >>> solve_congruences(0, 4, 2, 6)
+    (8, 12)
+    >>> solve_congruences(0, 2, 1, 4) is None
+    True
+    """
+    gcd = math.gcd(modulus_a, modulus_b)
+    if (remainder_b - remainder_a) % gcd:
+        return None
+    reduced_b = modulus_b // gcd
+    factor = (remainder_b - remainder_a) // gcd * pow(modulus_a // gcd, -1, reduced_b)
+    lcm = modulus_a * reduced_b
+    return (remainder_a + modulus_a * (factor % reduced_b)) % lcm, lcm
+
+
+def combine_ghost_cycles(cycles: list[GhostCycle]) -> int | None:
+    """
+    First step at which every ghost stands on a Z node, if there is any.
+    """
+    if not cycles:
+        # no ghost is off a Z node, as with the step by step simulation
+        return 0
+    # before every ghost is cycling, only the finitely many early hits can match
+    start = max(cycle.offset for cycle in cycles)
+    latest = max(cycles, key=lambda cycle: cycle.offset)
+    for step in latest.hits:
+        if step < start and all(cycle.is_hit(step) for cycle in cycles):
+            return step
+
+    solutions = [(0, 1)]
+    for cycle in cycles:
+        remainders = {
+            step % cycle.length for step in cycle.hits if step >= cycle.offset
+        }
+        solutions = [
+            solution
+            for remainder, modulus in solutions
+            for other in remainders
+            if (solution := solve_congruences(remainder, modulus, other, cycle.length))
+        ]
+    if not solutions:
+        return None
+    return min(
+        start + (remainder - start) % modulus for remainder, modulus in solutions
+    )
+
+
+def play_game(puzzle: str) -> int:
+    directions, network = parse_puzzle(puzzle)
+    compiled = compile_network(directions, network)
+    goals = find_goal_mask(compiled)
+
+    cycles = [
+        find_ghost_cycle(compiled, goals, compiled.node_id(node))
+        for node in find_starting_nodes(network)
+    ]
+    steps = combine_ghost_cycles(cycles)
+    if steps is None:
+        raise ValueError("Ghosts never stand on Z nodes at the same time")
+    return steps
+
+
+def simulate_ghosts(
+    network: CompiledNetwork,
+    goals: bytes,
+    starts: Sequence[int],
+    max_steps: int | None = None,
+) -> int | None:
+    """
+    Walk every ghost in lockstep, moving all of them with one fancy index.
+
+    Returns None if they are not all on Z nodes within `max_steps` steps.
+    """
+    successors = np.stack([np.asarray(network.left), np.asarray(network.right)])
+    is_goal = np.frombuffer(goals, dtype=np.bool_)
+    positions = np.asarray(starts, dtype=np.int64)
+    for counter, direction in enumerate(itertools.cycle(network.directions)):
+        if is_goal[positions].all():
+            return counter
+        if counter == max_steps:
+            return None
+        positions = successors[direction, positions]
+    raise RuntimeError("Unreachable")
+
+
+def play_game_lockstep(puzzle: str) -> int:
+    directions, network = parse_puzzle(puzzle)
+    compiled = compile_network(directions, network)
+    starts = [compiled.node_id(node) for node in find_starting_nodes(network)]
+    steps = simulate_ghosts(compiled, find_goal_mask(compiled), starts)
+    assert steps is not None
+    return steps
+
+
+# network shared with the worker processes by `attach_shared_network`
+shared_network: tuple[CompiledNetwork, memoryview, shared_memory.SharedMemory]
+
+
+def attach_shared_network(name: str, nodes: int, period: int) -> None:
+    global shared_network
+    block = shared_memory.SharedMemory(name=name)
+    buf = block.buf
+    assert buf is not None
+    left = buf[: 8 * nodes].cast("q")
+    right = buf[8 * nodes : 16 * nodes].cast("q")
+    directions = buf[16 * nodes : 16 * nodes + period]
+    goals = buf[16 * nodes + period :][:nodes]
+    shared_network = (CompiledNetwork([], left, right, directions, {}), goals, block)
+
+
+def find_shared_ghost_cycle(start: int) -> GhostCycle:
+    network, goals, _ = shared_network
+    return find_ghost_cycle(network, goals, start)
+
+
+def find_ghost_cycles_parallel(
+    network: CompiledNetwork,
+    goals: bytes,
+    starts: Sequence[int],
+    max_workers: int | None = None,
+) -> list[GhostCycle]:
+    """
+    Run `find_ghost_cycle` for every start in a process pool.
+
+    The network is copied once into shared memory instead of being pickled
+    for every worker.
+    """
+    nodes, period = len(network.names), len(network.directions)
+    block = shared_memory.SharedMemory(create=True, size=16 * nodes + period + nodes)
+    buf = block.buf
+    assert buf is not None
+    try:
+        buf[: 8 * nodes] = memoryview(network.left).cast("B")
+        buf[8 * nodes : 16 * nodes] = memoryview(network.right).cast("B")
+        buf[16 * nodes : 16 * nodes + period] = bytes(network.directions)
+        buf[16 * nodes + period :][:nodes] = goals
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers,
+            initializer=attach_shared_network,
+            initargs=(block.name, nodes, period),
+        ) as executor:
+            return list(executor.map(find_shared_ghost_cycle, starts))
+    finally:
+        block.close()
+        block.unlink()
+
+
+def play_game_parallel(puzzle: str, max_workers: int | None = None) -> int:
+    directions, network = parse_puzzle(puzzle)
+    compiled = compile_network(directions, network)
+    starts = [compiled.node_id(node) for node in find_starting_nodes(network)]
+    cycles = find_ghost_cycles_parallel(
+        compiled, find_goal_mask(compiled), starts, max_workers
+    )
+    steps = combine_ghost_cycles(cycles)
+    if steps is None:
+        raise ValueError("Ghosts never stand on Z nodes at the same time")
+    return steps
+
+
+class StepsToGoal:
+    """
+    Steps from every (node, direction index) state to the first goal node.
+
+    Each state is walked at most once: a walk stops on a state whose distance
+    is already known, and the distances are then filled backwards along it.
+    """
+
+    UNREACHABLE = -1
+    _ON_PATH = -2
+    _UNKNOWN = -3
+
+    def __init__(
+        self, network: CompiledNetwork, is_goal: Callable[[str], bool] = is_goal_node
+    ) -> None:
+        self.ids = network.ids
+        nodes, period = len(network.names), len(network.directions)
+        goals = [is_goal(name) for name in network.names]
+        successors = network.successors
+
+        self.steps = array.array("q", [self._UNKNOWN]) * (nodes * period)
+        for first_state in range(len(self.steps)):
+            path = []
+            state = first_state
+            while self.steps[state] == self._UNKNOWN:
+                idx, node = divmod(state, nodes)
+                if goals[node]:
+                    self.steps[state] = 0
+                    break
+                self.steps[state] = self._ON_PATH
+                path.append(state)
+                next_node = successors[network.directions[idx]][node]
+                state = (idx + 1) % period * nodes + next_node
+
+            distance = max(self.steps[state], self.UNREACHABLE)
+            for state in reversed(path):
+                if distance != self.UNREACHABLE:
+                    distance += 1
+                self.steps[state] = distance
+
+    def from_node(self, name: str, direction_index: int = 0) -> int | None:
+        steps = self.steps[direction_index * len(self.ids) + self.ids[name]]
+        return None if steps == self.UNREACHABLE else steps
+
+
+CACHE_MAGIC = b"DAY8NET1"
+# magic, number of nodes, number of directions, size of the encoded names
+CACHE_HEADER = struct.Struct("<8sQQQ")
+
+
+def network_cache_file(puzzle: str, directory: pathlib.Path) -> pathlib.Path:
+    digest = hashlib.sha256(puzzle.encode()).hexdigest()[:16]
+    return directory / f"network-{digest}.bin"
+
+
+def save_compiled_network(path: pathlib.Path, network: CompiledNetwork) -> None:
+    """
+    Store the network and its Z-mask, the ids arrays first so they stay aligned.
+    Every writer goes through its own temporary file.
+    """
+    names = "\n".join(network.names).encode()
+    z_mask = find_goal_mask(network)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+    tmp_path = pathlib.Path(tmp_name)
+    with open(fd, "wb") as f:
+        f.write(
+            CACHE_HEADER.pack(
+                CACHE_MAGIC, len(network.names), len(network.directions), len(names)
+            )
+        )
+        f.write(memoryview(network.left).cast("B"))
+        f.write(memoryview(network.right).cast("B"))
+        f.write(bytes(network.directions))
+        f.write(z_mask)
+        f.write(names)
+    tmp_path.replace(path)
+
+
+def load_compiled_network(
+    path: pathlib.Path,
+) -> tuple[CompiledNetwork, memoryview] | None:
+    """
+    Map a saved network, or return None if it is missing, truncated or not a
+    compiled network.
+    """
+    if not path.exists() or path.stat().st_size < CACHE_HEADER.size:
+        return None
+    with path.open("rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, nodes, period, names_size = CACHE_HEADER.unpack_from(mapped)
+    expected_size = CACHE_HEADER.size + 17 * nodes + period + names_size
+    if magic != CACHE_MAGIC or len(mapped) != expected_size:
+        mapped.close()
+        return None
+    buffer = memoryview(mapped)
+    offset = CACHE_HEADER.size
+    left = buffer[offset : offset + 8 * nodes].cast("q")
+    offset += 8 * nodes
+    right = buffer[offset : offset + 8 * nodes].cast("q")
+    offset += 8 * nodes
+    directions = buffer[offset : offset + period]
+    offset += period
+    z_mask = buffer[offset : offset + nodes]
+    offset += nodes
+    names = bytes(buffer[offset : offset + names_size]).decode().split("\n")
+    ids = {name: idx for idx, name in enumerate(names)}
+    return CompiledNetwork(names, left, right, directions, ids), z_mask
+
+
+def load_network(
+    puzzle: str, directory: pathlib.Path = puzzle_file.parent
+) -> tuple[CompiledNetwork, memoryview]:
+    """
+    Compiled network of the puzzle, cached on disk by the hash of its contents.
+    """
+    path = network_cache_file(puzzle, directory)
+    loaded = load_compiled_network(path)
+    if loaded is None:
+        save_compiled_network(path, compile_network(*parse_puzzle(puzzle)))
+        loaded = load_compiled_network(path)
+    if loaded is None:
+        raise RuntimeError(f"Could not load the compiled network: {path}")
+    return loaded
+
+
+def play_game_cached(puzzle: str, directory: pathlib.Path = puzzle_file.parent) -> int:
+    network, z_mask = load_network(puzzle, directory)
+    cycles = [
+        find_ghost_cycle(network, z_mask, node)
+        for node, name in enumerate(network.names)
+        if name.endswith("A")
+    ]
+    steps = combine_ghost_cycles(cycles)
+    if steps is None:
+        raise ValueError("Ghosts never stand on Z nodes at the same time")
+    return steps
+
+
 PUZZLE_1 = """
 LR
 
@@ -158,12 +566,121 @@ def test_play_game_1() -> None:
     assert play_game(PUZZLE_1) == 6
 
 
+def test_compile_network_1() -> None:
+    network = compile_network(*parse_puzzle(PUZZLE_1))
+
+    assert network.names == ["11A", "11B", "11Z", "22A", "22B", "22C", "22Z", "XXX"]
+    assert list(network.left) == [1, 7, 1, 4, 5, 6, 4, 7]
+    assert list(network.right) == [7, 2, 7, 7, 5, 6, 4, 7]
+    assert list(network.directions) == [0, 1]
+    assert find_goal_mask(network) == bytes([0, 0, 1, 0, 0, 0, 1, 0])
+
+
+def test_find_ghost_cycle() -> None:
+    network = compile_network(*parse_puzzle(PUZZLE_1))
+    goals = find_goal_mask(network)
+
+    assert find_ghost_cycle(network, goals, 0) == GhostCycle(1, 2, [2])
+    assert find_ghost_cycle(network, goals, 3) == GhostCycle(1, 6, [3, 6])
+
+
+@pytest.mark.parametrize(
+    "cycles,expected",
+    [
+        ([GhostCycle(1, 2, [2]), GhostCycle(1, 6, [3, 6])], 6),
+        ([GhostCycle(1, 2, [2]), GhostCycle(1, 3, [3]), GhostCycle(1, 4, [4])], 12),
+        ([GhostCycle(5, 3, [2, 6]), GhostCycle(0, 4, [2])], 2),
+        ([GhostCycle(2, 3, [4]), GhostCycle(0, 5, [3])], 13),
+        ([GhostCycle(0, 2, [0]), GhostCycle(0, 2, [1])], None),
+        ([GhostCycle(3, 1, [0]), GhostCycle(0, 1, [0])], 0),
+        ([], 0),
+    ],
+)
+def test_combine_ghost_cycles(cycles: list[GhostCycle], expected: int | None) -> None:
+    assert combine_ghost_cycles(cycles) == expected
+
+
+def test_play_game_compiled() -> None:
+    assert play_game_compiled(PUZZLE_1) == 6
+
+
+def test_simulate_ghosts() -> None:
+    network = compile_network(*parse_puzzle(PUZZLE_1))
+    goals = find_goal_mask(network)
+
+    assert simulate_ghosts(network, goals, [0, 3]) == 6
+    assert simulate_ghosts(network, goals, [0, 3], max_steps=5) is None
+    assert simulate_ghosts(network, goals, [2, 6]) == 0
+    assert simulate_ghosts(network, goals, [7], max_steps=100) is None
+
+
+def test_play_game_lockstep() -> None:
+    assert play_game_lockstep(PUZZLE_1) == 6
+
+
+def test_find_ghost_cycles_parallel() -> None:
+    network = compile_network(*parse_puzzle(PUZZLE_1))
+    goals = find_goal_mask(network)
+
+    assert find_ghost_cycles_parallel(network, goals, [0, 3], max_workers=2) == [
+        find_ghost_cycle(network, goals, 0),
+        find_ghost_cycle(network, goals, 3),
+    ]
+
+
+def test_play_game_parallel() -> None:
+    assert play_game_parallel(PUZZLE_1, max_workers=2) == 6
+
+
+def test_steps_to_goal() -> None:
+    steps_to_goal = StepsToGoal(compile_network(*parse_puzzle(PUZZLE_1)))
+
+    assert steps_to_goal.from_node("11A") == 2
+    assert steps_to_goal.from_node("22A") == 3
+    assert steps_to_goal.from_node("22B", direction_index=1) == 2
+    assert steps_to_goal.from_node("XXX") is None
+
+    steps_to_goal = StepsToGoal(
+        compile_network(*parse_puzzle(PUZZLE_1)), lambda name: name == "22Z"
+    )
+    assert steps_to_goal.from_node("11A") is None
+    assert steps_to_goal.from_node("22A") == 3
+
+
+def test_load_network(tmp_path: pathlib.Path) -> None:
+    compiled = compile_network(*parse_puzzle(PUZZLE_1))
+    network, z_mask = load_network(PUZZLE_1, tmp_path)
+
+    assert network.names == compiled.names
+    assert network.ids == compiled.ids
+    assert list(network.left) == list(compiled.left)
+    assert list(network.right) == list(compiled.right)
+    assert bytes(network.directions) == bytes(compiled.directions)
+    assert bytes(z_mask) == find_goal_mask(compiled)
+    assert [path.name for path in tmp_path.iterdir()] == [
+        network_cache_file(PUZZLE_1, tmp_path).name
+    ]
+
+    load_network(PUZZLE_1, tmp_path)
+    path = network_cache_file(PUZZLE_1, tmp_path)
+    path.write_bytes(path.read_bytes()[:-1])
+    assert load_compiled_network(path) is None
+    assert list(load_network(PUZZLE_1, tmp_path)[0].left) == list(compiled.left)
+    path.write_bytes(b"not a network")
+    assert load_compiled_network(path) is None
+    assert load_network(PUZZLE_1, tmp_path)[0].names == compiled.names
+    load_network(PUZZLE_1.replace("LR", "RL"), tmp_path)
+    assert len(list(tmp_path.iterdir())) == 2
+
+
+def test_play_game_cached(tmp_path: pathlib.Path) -> None:
+    assert play_game_cached(PUZZLE_1, tmp_path) == 6
+    assert play_game_cached(PUZZLE_1, tmp_path) == 6
+
+
 def main() -> None:
     puzzle = puzzle_file.read_text()
-    from math import lcm
-
-    print(lcm(13201, 18113, 20569, 21797, 22411, 24253))
-    print(play_game(puzzle))
+    print(play_game_cached(puzzle))
 
 
 if __name__ == "__main__":
@@ -71,8 +71,15 @@ If you find the next value for each history in this example and add them togethe
 
 Analyze your OASIS report and extrapolate the next value for each history. What is the sum of these extrapolated values?
 """
+import array
+import functools
 import itertools
+import math
+import operator
 import pathlib
+from typing import Sequence
+
+import numpy as np
 
 
 puzzle_file = pathlib.Path(__file__).parent / "puzzle.txt"
@@ -96,12 +103,143 @@ def find_next_value(puzzle: list[int]) -> int:
     return sum(line[-1] for line in lines)
 
 
+@functools.cache
+def next_value_weights(length: int) -> tuple[int, ...]:
+    """
+    Alternating binomial weights giving the next value of a history as a dot
+    product, which is the bottom-up sum of the difference pyramid unrolled.
+
+    >>> next_value_weights(3)
+    (1, -3, 3)
+    """
+    return tuple(
+        (-1) ** (length - 1 - idx) * math.comb(length, idx) for idx in range(length)
+    )
+
+
+def extrapolate_next(history: Sequence[int]) -> int:
+    """
+    >>> extrapolate_next([10, 13, 16, 21, 30, 45])
+    68
+    """
+    return sum(map(operator.mul, next_value_weights(len(history)), history))
+
+
 def play_game(puzzle: list[str]) -> int:
     """
     >>> play_game(["0 3 6 9 12 15", "1 3 6 10 15 21", "10 13 16 21 30 45"])
     114
     """
-    return sum(find_next_value([int(i) for i in line.split(" ")]) for line in puzzle)
+    return sum(extrapolate_next([int(i) for i in line.split(" ")]) for line in puzzle)
+
+
+# bounded, so that streaming millions of histories keeps a constant footprint
+@functools.lru_cache(maxsize=4096)
+def difference_edges(
+    history: tuple[int, ...]
+) -> tuple[tuple[int, ...], tuple[int, ...]]:
+    """
+    First and last values of each row of the difference pyramid, stopping
+    before the first all-zero row, so their length is the degree plus one.
+
+    >>> difference_edges((10, 13, 16, 21, 30, 45))
+    ((10, 3, 0, 2), (45, 15, 6, 2))
+    """
+    row = list(history)
+    firsts, lasts = [], []
+    while any(row):
+        firsts.append(row[0])
+        lasts.append(row[-1])
+        row = [b - a for a, b in itertools.pairwise(row)]
+    return tuple(firsts), tuple(lasts)
+
+
+def forecast(history: Sequence[int], steps: int) -> list[int]:
+    """
+    >>> forecast([1, 3, 6, 10, 15, 21], 3)
+    [28, 36, 45]
+    """
+    _, lasts = difference_edges(tuple(history))
+    levels = list(lasts)
+    result = []
+    for _ in range(steps):
+        for level in reversed(range(len(levels) - 1)):
+            levels[level] += levels[level + 1]
+        result.append(levels[0] if levels else 0)
+    return result
+
+
+def sum_extrapolations_bulk(puzzle: list[str]) -> tuple[int, int]:
+    """
+    Sums of the next and of the previous values of equal-length histories.
+
+    Uses one int64 matrix-vector product per direction for the rows that
+    cannot overflow, and exact Python integers for the others.
+
+    >>> sum_extrapolations_bulk(["0 3 6 9 12 15", "10 13 16 21 30 45"])
+    (86, 2)
+    """
+    exact_lines, next_sum, previous_sum = puzzle, 0, 0
+    if len({line.count(" ") for line in puzzle}) == 1:
+        # out of range values saturate to the int64 bounds, which the guard rejects
+        values = np.fromstring(" ".join(puzzle), dtype=np.int64, sep=" ")
+        matrix = values.reshape(len(puzzle), -1)
+        length = matrix.shape[1]
+        # the weights add up to 2**length - 1 in absolute value
+        limit = (2**63 - 1) // ((1 << length) - 1)
+        safe = (matrix.max(axis=1) < limit) & (matrix.min(axis=1) > -limit)
+        weights = np.array(next_value_weights(length), dtype=np.int64)
+        safe_rows = matrix[safe]
+        next_values, previous_values = safe_rows @ weights, safe_rows @ weights[::-1]
+        next_sum = sum(next_values.tolist())
+        previous_sum = sum(previous_values.tolist())
+        exact_lines = [puzzle[idx] for idx in np.flatnonzero(~safe)]
+
+    histories = [[int(i) for i in line.split(" ")] for line in exact_lines]
+    return (
+        next_sum + sum(extrapolate_next(history) for history in histories),
+        previous_sum + sum(extrapolate_next(history[::-1]) for history in histories),
+    )
+
+
+def play_game_bulk(puzzle: list[str]) -> int:
+    return sum_extrapolations_bulk(puzzle)[0]
+
+
+def read_history(line: str, buffer: array.array[int]) -> int:
+    """
+    Parse a history into `buffer`, growing it if needed, and return its length.
+    """
+    length = 0
+    for length, token in enumerate(line.split(), start=1):
+        if length > len(buffer):
+            buffer.append(0)
+        buffer[length - 1] = int(token)
+    return length
+
+
+def next_value_in_place(buffer: array.array[int], length: int) -> int:
+    """
+    Reduce `buffer[:length]` to the last value of every difference row.
+
+    >>> next_value_in_place(array.array("q", [10, 13, 16, 21, 30, 45, 99]), 6)
+    68
+    """
+    for end in range(length - 1, 0, -1):
+        for idx in range(end):
+            buffer[idx] = buffer[idx + 1] - buffer[idx]
+    return sum(itertools.islice(buffer, length))
+
+
+def play_game_stream(path: pathlib.Path) -> int:
+    """
+    Read the report one line at a time, reusing a single int64 row buffer.
+    """
+    buffer = array.array("q", [0]) * 32
+    with path.open() as f:
+        return sum(
+            next_value_in_place(buffer, read_history(line, buffer)) for line in f
+        )
 
 
 def test_find_next_value() -> None:
@@ -110,10 +248,64 @@ def test_find_next_value() -> None:
     assert find_next_value([10, 13, 16, 21, 30, 45]) == 68
 
 
+def test_extrapolate_next() -> None:
+    assert extrapolate_next([0, 3, 6, 9, 12, 15]) == 18
+    assert extrapolate_next([1, 3, 6, 10, 15, 21]) == 28
+    assert extrapolate_next([10, 13, 16, 21, 30, 45]) == 68
+    assert extrapolate_next([7]) == 7
+    for history in ([idx**3 - 2 * idx**2 + 5 for idx in range(7)], [-4, -4, -4]):
+        assert extrapolate_next(history) == find_next_value(history)
+
+
 def test_play_game() -> None:
     assert play_game(["0 3 6 9 12 15", "1 3 6 10 15 21", "10 13 16 21 30 45"]) == 114
 
 
+def test_forecast() -> None:
+    assert forecast([0, 3, 6, 9, 12, 15], 2) == [18, 21]
+    assert forecast([10, 13, 16, 21, 30, 45], 1) == [68]
+    assert forecast([0, 0, 0], 2) == [0, 0]
+    assert forecast([4, 4], 0) == []
+
+    history = [idx**3 - 2 * idx**2 + 5 for idx in range(7)]
+    extended = list(history)
+    for _ in range(10):
+        extended.append(find_next_value(extended))
+    assert forecast(history, 10) == extended[len(history) :]
+
+
+def test_sum_extrapolations_bulk() -> None:
+    puzzle = ["0 3 6 9 12 15", "1 3 6 10 15 21", "10 13 16 21 30 45"]
+    assert sum_extrapolations_bulk(puzzle) == (114, 2)
+    assert sum_extrapolations_bulk([]) == (0, 0)
+    # ragged histories and values past int64 take the exact path
+    assert sum_extrapolations_bulk(["1 2 3", "5 5"]) == (9, 5)
+    huge = [" ".join(str(10**30 * idx) for idx in range(5))]
+    assert sum_extrapolations_bulk(huge) == (5 * 10**30, -(10**30))
+    wide = [" ".join(str(2**40 + idx) for idx in range(30))]
+    assert sum_extrapolations_bulk(wide) == (2**40 + 30, 2**40 - 1)
+    # only the rows that could overflow leave the int64 product
+    mixed = puzzle + [" ".join(str(10**17 * idx) for idx in range(6))]
+    assert sum_extrapolations_bulk(mixed) == (114 + 6 * 10**17, 2 - 10**17)
+    assert sum_extrapolations_bulk([str(2**63), "5"]) == (2**63 + 5, 2**63 + 5)
+
+
+def test_play_game_bulk() -> None:
+    assert (
+        play_game_bulk(["0 3 6 9 12 15", "1 3 6 10 15 21", "10 13 16 21 30 45"]) == 114
+    )
+
+
+def test_play_game_stream(tmp_path: pathlib.Path) -> None:
+    path = tmp_path / "puzzle.txt"
+    path.write_text("0 3 6 9 12 15\n1 3 6 10 15 21\n10 13 16 21 30 45\n")
+    assert play_game_stream(path) == 114
+
+    history = [idx**5 - 7 * idx for idx in range(40)]
+    path.write_text(" ".join(map(str, history)) + "\n5\n")
+    assert play_game_stream(path) == extrapolate_next(history) + 5
+
+
 def main() -> None:
     puzzle = puzzle_file.read_text().splitlines()
     print(play_game(puzzle))
@@ -97,8 +97,15 @@ Doing this for the remaining example data above results in previous values of -3
 Analyze your OASIS report again, this time extrapolating the previous value for each history. What is the sum of these extrapolated values?
 """
 
+import array
+import functools
 import itertools
+import math
+import operator
 import pathlib
+from typing import Sequence
+
+import numpy as np
 
 
 puzzle_file = pathlib.Path(__file__).parent / "puzzle.txt"
@@ -117,8 +124,144 @@ def find_next_value(puzzle: list[int]) -> int:
     return last_value
 
 
+@functools.cache
+def previous_value_weights(length: int) -> tuple[int, ...]:
+    """
+    Alternating binomial weights giving the previous value of a history as a
+    dot product, which is the bottom-up difference of the pyramid unrolled.
+
+    >>> previous_value_weights(3)
+    (3, -3, 1)
+    """
+    return tuple((-1) ** idx * math.comb(length, idx + 1) for idx in range(length))
+
+
+def extrapolate_previous(history: Sequence[int]) -> int:
+    """
+    >>> extrapolate_previous([10, 13, 16, 21, 30, 45])
+    5
+    """
+    return sum(map(operator.mul, previous_value_weights(len(history)), history))
+
+
 def play_game(puzzle: list[str]) -> int:
-    return sum(find_next_value([int(i) for i in line.split(" ")]) for line in puzzle)
+    return sum(
+        extrapolate_previous([int(i) for i in line.split(" ")]) for line in puzzle
+    )
+
+
+# bounded, so that streaming millions of histories keeps a constant footprint
+@functools.lru_cache(maxsize=4096)
+def difference_edges(
+    history: tuple[int, ...]
+) -> tuple[tuple[int, ...], tuple[int, ...]]:
+    """
+    First and last values of each row of the difference pyramid, stopping
+    before the first all-zero row, so their length is the degree plus one.
+
+    >>> difference_edges((10, 13, 16, 21, 30, 45))
+    ((10, 3, 0, 2), (45, 15, 6, 2))
+    """
+    row = list(history)
+    firsts, lasts = [], []
+    while any(row):
+        firsts.append(row[0])
+        lasts.append(row[-1])
+        row = [b - a for a, b in itertools.pairwise(row)]
+    return tuple(firsts), tuple(lasts)
+
+
+def backcast(history: Sequence[int], steps: int) -> list[int]:
+    """
+    Values before the start of the history, closest first.
+
+    >>> backcast([10, 13, 16, 21, 30, 45], 3)
+    [5, -4, -19]
+    """
+    firsts, _ = difference_edges(tuple(history))
+    levels = list(firsts)
+    result = []
+    for _ in range(steps):
+        for level in reversed(range(len(levels) - 1)):
+            levels[level] -= levels[level + 1]
+        result.append(levels[0] if levels else 0)
+    return result
+
+
+def sum_extrapolations_bulk(puzzle: list[str]) -> tuple[int, int]:
+    """
+    Sums of the next and of the previous values of equal-length histories.
+
+    Uses one int64 matrix-vector product per direction for the rows that
+    cannot overflow, and exact Python integers for the others.
+
+    >>> sum_extrapolations_bulk(["0 3 6 9 12 15", "10 13 16 21 30 45"])
+    (86, 2)
+    """
+    exact_lines, next_sum, previous_sum = puzzle, 0, 0
+    if len({line.count(" ") for line in puzzle}) == 1:
+        # out of range values saturate to the int64 bounds, which the guard rejects
+        values = np.fromstring(" ".join(puzzle), dtype=np.int64, sep=" ")
+        matrix = values.reshape(len(puzzle), -1)
+        length = matrix.shape[1]
+        # the weights add up to 2**length - 1 in absolute value
+        limit = (2**63 - 1) // ((1 << length) - 1)
+        safe = (matrix.max(axis=1) < limit) & (matrix.min(axis=1) > -limit)
+        weights = np.array(previous_value_weights(length), dtype=np.int64)
+        safe_rows = matrix[safe]
+        previous_values, next_values = safe_rows @ weights, safe_rows @ weights[::-1]
+        next_sum = sum(next_values.tolist())
+        previous_sum = sum(previous_values.tolist())
+        exact_lines = [puzzle[idx] for idx in np.flatnonzero(~safe)]
+
+    histories = [[int(i) for i in line.split(" ")] for line in exact_lines]
+    return (
+        next_sum + sum(extrapolate_previous(history[::-1]) for history in histories),
+        previous_sum + sum(extrapolate_previous(history) for history in histories),
+    )
+
+
+def play_game_bulk(puzzle: list[str]) -> int:
+    return sum_extrapolations_bulk(puzzle)[1]
+
+
+def read_history(line: str, buffer: array.array[int]) -> int:
+    """
+    Parse a history into `buffer`, growing it if needed, and return its length.
+    """
+    length = 0
+    for length, token in enumerate(line.split(), start=1):
+        if length > len(buffer):
+            buffer.append(0)
+        buffer[length - 1] = int(token)
+    return length
+
+
+def previous_value_in_place(buffer: array.array[int], length: int) -> int:
+    """
+    Reduce `buffer[:length]` to the first value of every difference row.
+
+    >>> previous_value_in_place(array.array("q", [10, 13, 16, 21, 30, 45, 99]), 6)
+    5
+    """
+    for start in range(1, length):
+        for idx in range(length - 1, start - 1, -1):
+            buffer[idx] = buffer[idx] - buffer[idx - 1]
+    return sum(
+        -value if idx % 2 else value
+        for idx, value in enumerate(itertools.islice(buffer, length))
+    )
+
+
+def play_game_stream(path: pathlib.Path) -> int:
+    """
+    Read the report one line at a time, reusing a single int64 row buffer.
+    """
+    buffer = array.array("q", [0]) * 32
+    with path.open() as f:
+        return sum(
+            previous_value_in_place(buffer, read_history(line, buffer)) for line in f
+        )
 
 
 def test_find_next_value() -> None:
@@ -127,10 +270,62 @@ def test_find_next_value() -> None:
     assert find_next_value([1, 3, 6, 10, 15, 21]) == 0
 
 
+def test_extrapolate_previous() -> None:
+    assert extrapolate_previous([10, 13, 16, 21, 30, 45]) == 5
+    assert extrapolate_previous([0, 3, 6, 9, 12, 15]) == -3
+    assert extrapolate_previous([1, 3, 6, 10, 15, 21]) == 0
+    assert extrapolate_previous([7]) == 7
+    for history in ([idx**3 - 2 * idx**2 + 5 for idx in range(7)], [-4, -4, -4]):
+        assert extrapolate_previous(history) == find_next_value(history)
+
+
 def test_play_game() -> None:
     assert play_game(["0 3 6 9 12 15", "1 3 6 10 15 21", "10 13 16 21 30 45"]) == 2
 
 
+def test_backcast() -> None:
+    assert backcast([0, 3, 6, 9, 12, 15], 2) == [-3, -6]
+    assert backcast([1, 3, 6, 10, 15, 21], 1) == [0]
+    assert backcast([0, 0, 0], 2) == [0, 0]
+    assert backcast([4, 4], 0) == []
+
+    history = [idx**3 - 2 * idx**2 + 5 for idx in range(7)]
+    extended = list(history)
+    for _ in range(10):
+        extended.insert(0, find_next_value(extended))
+    assert backcast(history, 10) == extended[9::-1]
+
+
+def test_sum_extrapolations_bulk() -> None:
+    puzzle = ["0 3 6 9 12 15", "1 3 6 10 15 21", "10 13 16 21 30 45"]
+    assert sum_extrapolations_bulk(puzzle) == (114, 2)
+    assert sum_extrapolations_bulk([]) == (0, 0)
+    # ragged histories and values past int64 take the exact path
+    assert sum_extrapolations_bulk(["1 2 3", "5 5"]) == (9, 5)
+    huge = [" ".join(str(10**30 * idx) for idx in range(5))]
+    assert sum_extrapolations_bulk(huge) == (5 * 10**30, -(10**30))
+    wide = [" ".join(str(2**40 + idx) for idx in range(30))]
+    assert sum_extrapolations_bulk(wide) == (2**40 + 30, 2**40 - 1)
+    # only the rows that could overflow leave the int64 product
+    mixed = puzzle + [" ".join(str(10**17 * idx) for idx in range(6))]
+    assert sum_extrapolations_bulk(mixed) == (114 + 6 * 10**17, 2 - 10**17)
+    assert sum_extrapolations_bulk([str(2**63), "5"]) == (2**63 + 5, 2**63 + 5)
+
+
+def test_play_game_bulk() -> None:
+    assert play_game_bulk(["0 3 6 9 12 15", "1 3 6 10 15 21", "10 13 16 21 30 45"]) == 2
+
+
+def test_play_game_stream(tmp_path: pathlib.Path) -> None:
+    path = tmp_path / "puzzle.txt"
+    path.write_text("0 3 6 9 12 15\n1 3 6 10 15 21\n10 13 16 21 30 45\n")
+    assert play_game_stream(path) == 2
+
+    history = [idx**5 - 7 * idx for idx in range(40)]
+    path.write_text(" ".join(map(str, history)) + "\n5\n")
+    assert play_game_stream(path) == extrapolate_previous(history) + 5
+
+
 def main() -> None:
     puzzle = puzzle_file.read_text().splitlines()
     print(play_game(puzzle))
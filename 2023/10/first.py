@@ -96,8 +96,14 @@ Here are the distances for each tile on that loop:
 
 Find the single giant loop starting at S. How many steps along the loop does it take to get from the starting position to the point farthest from the starting position?
 """
+import array
+import collections
+import hashlib
+import mmap
 import pathlib
-from typing import Iterator
+import struct
+import tempfile
+from typing import Iterator, NamedTuple
 
 
 puzzle_file = pathlib.Path(__file__).parent / "puzzle.txt"
@@ -148,14 +154,16 @@ def find_neighbours(
 def play_game(puzzle: list[str]) -> int:
     distance_matrix = [[0 for _ in line] for line in puzzle]
     start = find_start(puzzle)
-    queue = [start]
-    visited: set[tuple[int, int]] = {start}
+    nbr_cols = len(puzzle[0])
+    queue = collections.deque([start])
+    visited = bytearray(len(puzzle) * nbr_cols)
+    visited[start[0] * nbr_cols + start[1]] = 1
     while queue:
-        row, col = queue.pop(0)
+        row, col = queue.popleft()
         for new_row, new_col in find_neighbours(puzzle, row, col):
-            if (new_row, new_col) in visited:
+            if visited[new_row * nbr_cols + new_col]:
                 continue
-            visited.add((new_row, new_col))
+            visited[new_row * nbr_cols + new_col] = 1
             # print((row, col), new_row, new_col)
             distance_matrix[new_row][new_col] = distance_matrix[row][col] + 1
             queue.append((new_row, new_col))
@@ -163,6 +171,177 @@ def play_game(puzzle: list[str]) -> int:
     return max(map(max, distance_matrix))
 
 
+def trace_loop(puzzle: list[str]) -> list[tuple[int, int]]:
+    """
+    Tiles of the main loop in walking order, starting from S.
+    """
+    start = find_start(puzzle)
+    nbr_cols = len(puzzle[0])
+    visited = bytearray(len(puzzle) * nbr_cols)
+    path = []
+    current: tuple[int, int] | None = start
+    while current is not None:
+        row, col = current
+        visited[row * nbr_cols + col] = 1
+        path.append(current)
+        current = next(
+            (
+                (new_row, new_col)
+                for new_row, new_col in find_neighbours(puzzle, row, col)
+                if not visited[new_row * nbr_cols + new_col]
+            ),
+            None,
+        )
+    return path
+
+
+def play_game_trace(puzzle: list[str]) -> int:
+    return len(trace_loop(puzzle)) // 2
+
+
+START_SHAPES = {
+    frozenset({(-1, 0), (1, 0)}): "|",
+    frozenset({(0, -1), (0, 1)}): "-",
+    frozenset({(-1, 0), (0, 1)}): "L",
+    frozenset({(-1, 0), (0, -1)}): "J",
+    frozenset({(1, 0), (0, -1)}): "7",
+    frozenset({(1, 0), (0, 1)}): "F",
+}
+
+
+class LoopAnalysis(NamedTuple):
+    """
+    Everything known about the main loop after walking it once.
+
+    Tiles are numbered `row * nbr_cols + col`. `path` lists the loop tiles in
+    walking order starting from S, `bitmap` holds `row_size` bytes per row with
+    bit `col & 7` of byte `col >> 3` set on loop tiles, and `distances`
+    holds the steps along the loop from S, or -1 for tiles off the loop.
+    """
+
+    nbr_rows: int
+    nbr_cols: int
+    start_shape: str
+    path: array.array[int] | memoryview
+    bitmap: bytes
+    distances: array.array[int] | memoryview
+
+    @property
+    def row_size(self) -> int:
+        return (self.nbr_cols + 7) // 8
+
+    def row_bits(self, row: int) -> bytes:
+        start = row * self.row_size
+        return self.bitmap[start : start + self.row_size]
+
+
+def analyse_loop(puzzle: list[str]) -> LoopAnalysis:
+    nbr_rows, nbr_cols = len(puzzle), len(puzzle[0])
+    tiles = trace_loop(puzzle)
+    start_row, start_col = tiles[0]
+    start_shape = START_SHAPES[
+        frozenset(
+            (row - start_row, col - start_col) for row, col in (tiles[1], tiles[-1])
+        )
+    ]
+    path = array.array("q", (row * nbr_cols + col for row, col in tiles))
+    row_size = (nbr_cols + 7) // 8
+    bitmap = bytearray(nbr_rows * row_size)
+    distances = array.array("q", [-1]) * (nbr_rows * nbr_cols)
+    for step, (row, col) in enumerate(tiles):
+        bitmap[row * row_size + (col >> 3)] |= 1 << (col & 7)
+        distances[row * nbr_cols + col] = min(step, len(tiles) - step)
+    return LoopAnalysis(nbr_rows, nbr_cols, start_shape, path, bytes(bitmap), distances)
+
+
+LOOP_CACHE_MAGIC = b"DAY10LP1"
+# magic, number of rows, number of columns, length of the loop, shape of S
+LOOP_CACHE_HEADER = struct.Struct("<8sQQQQ")
+
+
+def loop_cache_file(puzzle: list[str], directory: pathlib.Path) -> pathlib.Path:
+    digest = hashlib.sha256("\n".join(puzzle).encode()).hexdigest()[:16]
+    return directory / f"loop-{digest}.bin"
+
+
+def save_loop_analysis(path: pathlib.Path, analysis: LoopAnalysis) -> None:
+    """
+    Store the analysis, the 8-byte arrays first so they stay aligned. Every
+    writer goes through its own temporary file.
+    """
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+    tmp_path = pathlib.Path(tmp_name)
+    with open(fd, "wb") as f:
+        f.write(
+            LOOP_CACHE_HEADER.pack(
+                LOOP_CACHE_MAGIC,
+                analysis.nbr_rows,
+                analysis.nbr_cols,
+                len(analysis.path),
+                ord(analysis.start_shape),
+            )
+        )
+        f.write(memoryview(analysis.path).cast("B"))
+        f.write(memoryview(analysis.distances).cast("B"))
+        f.write(analysis.bitmap)
+    tmp_path.replace(path)
+
+
+def read_loop_analysis(path: pathlib.Path) -> LoopAnalysis | None:
+    """
+    Map a saved analysis, or return None if it is missing, truncated or not a
+    loop analysis.
+    """
+    if not path.exists() or path.stat().st_size < LOOP_CACHE_HEADER.size:
+        return None
+    with path.open("rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, nbr_rows, nbr_cols, length, shape = LOOP_CACHE_HEADER.unpack_from(mapped)
+    expected_size = (
+        LOOP_CACHE_HEADER.size
+        + 8 * length
+        + 8 * nbr_rows * nbr_cols
+        + nbr_rows * ((nbr_cols + 7) // 8)
+    )
+    if (
+        magic != LOOP_CACHE_MAGIC
+        or len(mapped) != expected_size
+        or chr(shape) not in START_SHAPES.values()
+    ):
+        mapped.close()
+        return None
+    buffer = memoryview(mapped)
+    offset = LOOP_CACHE_HEADER.size
+    loop_path = buffer[offset : offset + 8 * length].cast("q")
+    offset += 8 * length
+    distances = buffer[offset : offset + 8 * nbr_rows * nbr_cols].cast("q")
+    offset += 8 * nbr_rows * nbr_cols
+    bitmap = bytes(buffer[offset : offset + nbr_rows * ((nbr_cols + 7) // 8)])
+    return LoopAnalysis(nbr_rows, nbr_cols, chr(shape), loop_path, bitmap, distances)
+
+
+def load_loop_analysis(
+    puzzle: list[str], directory: pathlib.Path = puzzle_file.parent
+) -> LoopAnalysis:
+    """
+    Loop analysis of the puzzle, cached on disk by the hash of its contents.
+    """
+    path = loop_cache_file(puzzle, directory)
+    analysis = read_loop_analysis(path)
+    if analysis is None:
+        save_loop_analysis(path, analyse_loop(puzzle))
+        analysis = read_loop_analysis(path)
+    if analysis is None:
+        raise RuntimeError(f"Could not load the loop analysis: {path}")
+    return analysis
+
+
+def play_game_analysis(
+    puzzle: list[str], directory: pathlib.Path = puzzle_file.parent
+) -> int:
+    return max(load_loop_analysis(puzzle, directory).distances)
+
+
 PUZZLE_1 = [
     ".....",
     ".S-7.",
@@ -192,9 +371,82 @@ def test_play_game() -> None:
     assert play_game(PUZZLE_2) == 8
 
 
+def test_trace_loop() -> None:
+    assert trace_loop(PUZZLE_1) == [
+        (1, 1),
+        (2, 1),
+        (3, 1),
+        (3, 2),
+        (3, 3),
+        (2, 3),
+        (1, 3),
+        (1, 2),
+    ]
+    assert len(trace_loop(PUZZLE_2)) == 16
+
+
+def test_play_game_trace() -> None:
+    assert play_game_trace(PUZZLE_1) == 4
+
+    assert play_game_trace(PUZZLE_2) == 8
+
+
+def test_analyse_loop() -> None:
+    analysis = analyse_loop(PUZZLE_1)
+    assert (analysis.nbr_rows, analysis.nbr_cols) == (5, 5)
+    assert analysis.start_shape == "F"
+    assert list(analysis.path) == [6, 11, 16, 17, 18, 13, 8, 7]
+    assert [analysis.row_bits(row) for row in range(5)] == [
+        bytes([0b00000]),
+        bytes([0b01110]),
+        bytes([0b01010]),
+        bytes([0b01110]),
+        bytes([0b00000]),
+    ]
+    assert [list(analysis.distances[row * 5 : row * 5 + 5]) for row in range(5)] == [
+        [-1, -1, -1, -1, -1],
+        [-1, 0, 1, 2, -1],
+        [-1, 1, -1, 3, -1],
+        [-1, 2, 3, 4, -1],
+        [-1, -1, -1, -1, -1],
+    ]
+    assert analyse_loop(PUZZLE_2).start_shape == "F"
+    assert analyse_loop(["F7", "LS"]).start_shape == "J"
+
+
+def test_load_loop_analysis(tmp_path: pathlib.Path) -> None:
+    analysis = analyse_loop(PUZZLE_2)
+    loaded = load_loop_analysis(PUZZLE_2, tmp_path)
+
+    assert loaded.start_shape == analysis.start_shape
+    assert list(loaded.path) == list(analysis.path)
+    assert loaded.bitmap == analysis.bitmap
+    assert list(loaded.distances) == list(analysis.distances)
+    assert [path.name for path in tmp_path.iterdir()] == [
+        loop_cache_file(PUZZLE_2, tmp_path).name
+    ]
+
+    load_loop_analysis(PUZZLE_2, tmp_path)
+    load_loop_analysis(PUZZLE_1, tmp_path)
+    assert len(list(tmp_path.iterdir())) == 2
+
+    path = loop_cache_file(PUZZLE_2, tmp_path)
+    path.write_bytes(path.read_bytes()[:-1])
+    assert read_loop_analysis(path) is None
+    assert list(load_loop_analysis(PUZZLE_2, tmp_path).path) == list(analysis.path)
+    path.write_bytes(b"not a loop")
+    assert read_loop_analysis(path) is None
+    assert load_loop_analysis(PUZZLE_2, tmp_path).bitmap == analysis.bitmap
+
+
+def test_play_game_analysis(tmp_path: pathlib.Path) -> None:
+    assert play_game_analysis(PUZZLE_1, tmp_path) == 4
+    assert play_game_analysis(PUZZLE_2, tmp_path) == 8
+
+
 def main() -> None:
     puzzle = puzzle_file.read_text().splitlines()
-    print(play_game(puzzle))
+    print(play_game_analysis(puzzle))
 
 
 if __name__ == "__main__":
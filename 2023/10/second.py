@@ -206,9 +206,15 @@ In this last example, 10 tiles are enclosed by the loop.
 Figure out whether you have time to search for the nest by calculating the area within the loop. How many tiles are enclosed by the loop?
 
 """
+import array
+import collections
+import hashlib
 import itertools
+import mmap
 import pathlib
-from typing import Iterator
+import struct
+import tempfile
+from typing import Iterator, NamedTuple
 
 import pytest
 
@@ -269,6 +275,57 @@ def expand_puzzle(puzzle: list[str]) -> list[str]:
     return ["".join(line) for line in expanded_puzzle]
 
 
+class Grid:
+    """
+    Rectangular grid of small integers stored row by row in one contiguous
+    array, so the tile (row, col) lives at `row * stride + col`.
+    """
+
+    def __init__(self, nbr_rows: int, nbr_cols: int, typecode: str = "B") -> None:
+        self.nbr_rows = nbr_rows
+        self.stride = nbr_cols
+        self.data = array.array(typecode, [0]) * (nbr_rows * nbr_cols)
+
+    @classmethod
+    def from_lines(cls, lines: list[str]) -> "Grid":
+        grid = cls(len(lines), len(lines[0]) if lines else 0)
+        grid.data = array.array("B", "".join(lines).encode())
+        return grid
+
+    def __getitem__(self, tile: tuple[int, int]) -> int:
+        row, col = tile
+        return self.data[row * self.stride + col]
+
+    def __setitem__(self, tile: tuple[int, int], value: int) -> None:
+        row, col = tile
+        self.data[row * self.stride + col] = value
+
+    def to_lines(self) -> list[str]:
+        return [
+            self.data[row * self.stride : (row + 1) * self.stride].tobytes().decode()
+            for row in range(self.nbr_rows)
+        ]
+
+
+def expand_grid(puzzle: list[str], loop: Grid) -> Grid:
+    """
+    `expand_puzzle` of the tiles set in `loop`, written straight into a byte
+    grid. Every other tile expands as ".".
+    """
+    expanded = Grid(len(puzzle) * 3, len(puzzle[0]) * 3 if puzzle else 0)
+    for idx, line in enumerate(puzzle):
+        blocks = [
+            MAP_CHAR_TO_EXPANDED[c if loop[idx, col] else "."]
+            for col, c in enumerate(line)
+        ]
+        for jdx in range(3):
+            start = (idx * 3 + jdx) * expanded.stride
+            expanded.data[start : start + expanded.stride] = array.array(
+                "B", "".join(block[jdx] for block in blocks).encode()
+            )
+    return expanded
+
+
 def color_puzzle(puzzle: list[str]) -> list[set[tuple[int, int]]]:
     if not puzzle:
         return []
@@ -331,6 +388,132 @@ def drop_boundary_zones(
     return [zones for idx, zones in enumerate(zones) if idx not in idx_to_delete]
 
 
+DOT = ord(".")
+
+
+def label_zones(grid: Grid) -> tuple[Grid, list[int], list[bool]]:
+    """
+    Label the zones of "." tiles in a single raster pass, merging the labels
+    that meet through a union-find, and resolve them in a second pass.
+
+    Returns the label of every tile, then the number of tiles and whether the
+    zone touches the border for every label. Label 0 stands for the tiles that
+    are not ".".
+    """
+    nbr_rows, nbr_cols = grid.nbr_rows, grid.stride
+    label_grid = Grid(nbr_rows, nbr_cols, "I")
+    labels = label_grid.data
+    parents = [0]
+
+    def find(label: int) -> int:
+        while parents[label] != label:
+            parents[label] = parents[parents[label]]
+            label = parents[label]
+        return label
+
+    for row in range(nbr_rows):
+        for col in range(nbr_cols):
+            idx = row * nbr_cols + col
+            if grid.data[idx] != DOT:
+                continue
+            up = labels[idx - nbr_cols] if row > 0 else 0
+            left = labels[idx - 1] if col > 0 else 0
+            if up and left:
+                up, left = find(up), find(left)
+                parents[max(up, left)] = min(up, left)
+                labels[idx] = min(up, left)
+            elif up or left:
+                labels[idx] = up or left
+            else:
+                parents.append(len(parents))
+                labels[idx] = len(parents) - 1
+
+    # roots are the first label of their zone, so zones keep their raster order
+    compact = [0] * len(parents)
+    nbr_zones = 0
+    for label in range(1, len(parents)):
+        if find(label) == label:
+            nbr_zones += 1
+            compact[label] = nbr_zones
+    sizes = [0] * (nbr_zones + 1)
+    on_border = [False] * len(sizes)
+    for idx, label in enumerate(labels):
+        if not label:
+            continue
+        label = labels[idx] = compact[find(label)]
+        sizes[label] += 1
+        row, col = divmod(idx, nbr_cols)
+        if row in (0, nbr_rows - 1) or col in (0, nbr_cols - 1):
+            on_border[label] = True
+    return label_grid, sizes, on_border
+
+
+def play_game_labels(puzzle: list[str]) -> int:
+    expanded = expand_grid(puzzle, loop_mask(puzzle))
+    labels, _, on_border = label_zones(expanded)
+    return sum(
+        1
+        for row in range(1, expanded.nbr_rows, 3)
+        for col in range(1, expanded.stride, 3)
+        if (label := labels[row, col]) and not on_border[label]
+    )
+
+
+def mark_exterior(grid: Grid) -> Grid:
+    """
+    Flood fill the "." tiles reachable from the border, seeding every border tile
+    at once. Exterior tiles are set to 1 in the returned grid.
+    """
+    nbr_rows, nbr_cols = grid.nbr_rows, grid.stride
+    exterior = Grid(nbr_rows, nbr_cols)
+    queue: collections.deque[int] = collections.deque()
+    for row in range(nbr_rows):
+        for col in range(nbr_cols):
+            if row in (0, nbr_rows - 1) or col in (0, nbr_cols - 1):
+                idx = row * nbr_cols + col
+                if grid.data[idx] == DOT and not exterior.data[idx]:
+                    exterior.data[idx] = 1
+                    queue.append(idx)
+    while queue:
+        idx = queue.popleft()
+        row, col = divmod(idx, nbr_cols)
+        for new_idx, inside in (
+            (idx - nbr_cols, row > 0),
+            (idx + nbr_cols, row < nbr_rows - 1),
+            (idx - 1, col > 0),
+            (idx + 1, col < nbr_cols - 1),
+        ):
+            if inside and grid.data[new_idx] == DOT and not exterior.data[new_idx]:
+                exterior.data[new_idx] = 1
+                queue.append(new_idx)
+    return exterior
+
+
+def interior_tiles(puzzle: list[str]) -> set[tuple[int, int]]:
+    """
+    The "." tiles of every zone kept by `drop_boundary_zones(color_puzzle(...))`,
+    without enumerating the zones.
+    """
+    grid = Grid.from_lines(puzzle)
+    exterior = mark_exterior(grid)
+    return {
+        divmod(idx, grid.stride)
+        for idx, char in enumerate(grid.data)
+        if char == DOT and not exterior.data[idx]
+    }
+
+
+def play_game_exterior(puzzle: list[str]) -> int:
+    expanded = expand_grid(puzzle, loop_mask(puzzle))
+    exterior = mark_exterior(expanded)
+    return sum(
+        1
+        for row in range(1, expanded.nbr_rows, 3)
+        for col in range(1, expanded.stride, 3)
+        if expanded[row, col] == DOT and not exterior[row, col]
+    )
+
+
 def play_game(puzzle: list[str]) -> int:
     only_main_loop = drop_non_main_loop(puzzle)
     # print(*only_main_loop, sep="\n", file=open("no-loop.txt", "w"))
@@ -398,20 +581,417 @@ def find_neighbours(puzzle: list[str], row: int, col: int) -> Iterator[tuple[int
 def find_loop(puzzle: list[str]) -> list[list[int]]:
     loop_matrix = [[0 for _ in line] for line in puzzle]
     start = find_start(puzzle)
-    queue = [start]
+    queue = collections.deque([start])
     loop_matrix[start[0]][start[1]] = 1
-    visited: set[tuple[int, int]] = {start}
     while queue:
-        row, col = queue.pop(0)
+        row, col = queue.popleft()
         for new_row, new_col in find_neighbours(puzzle, row, col):
-            if (new_row, new_col) in visited:
+            if loop_matrix[new_row][new_col]:
                 continue
-            visited.add((new_row, new_col))
             loop_matrix[new_row][new_col] = 1
             queue.append((new_row, new_col))
     return loop_matrix
 
 
+def walk_loop(puzzle: list[str]) -> Iterator[tuple[int, int]]:
+    """
+    Tiles of the main loop in order, starting from S.
+    """
+    start = find_start(puzzle)
+    previous, current = start, next(find_neighbours(puzzle, *start))
+    yield start
+    while True:
+        yield current
+        following = [
+            tile for tile in find_neighbours(puzzle, *current) if tile != previous
+        ]
+        if not following:
+            return
+        previous, current = current, following[0]
+
+
+def loop_mask(puzzle: list[str]) -> Grid:
+    mask = Grid(len(puzzle), len(puzzle[0]) if puzzle else 0)
+    for tile in walk_loop(puzzle):
+        mask[tile] = 1
+    return mask
+
+
+def play_game_shoelace(puzzle: list[str]) -> int:
+    start = find_start(puzzle)
+    double_area = 0
+    boundary = 0
+    for (row, col), (next_row, next_col) in itertools.pairwise(
+        itertools.chain(walk_loop(puzzle), [start])
+    ):
+        double_area += row * next_col - next_row * col
+        boundary += 1
+    # Pick's theorem: area = interior + boundary / 2 - 1
+    return (abs(double_area) - boundary) // 2 + 1
+
+
+NORTH_PIPES = "|LJ"
+
+
+def loop_bitmap(puzzle: list[str]) -> list[bytearray]:
+    """
+    Main loop membership, as one packed row per line with bit `col & 7` of byte
+    `col >> 3` set on loop tiles.
+    """
+    row_size = (len(puzzle[0]) + 7) // 8 if puzzle else 0
+    bitmap = [bytearray(row_size) for _ in puzzle]
+    for row, col in walk_loop(puzzle):
+        bitmap[row][col >> 3] |= 1 << (col & 7)
+    return bitmap
+
+
+def count_row_interior(
+    line: str, loop_bits: bytes | bytearray, north_pipes: str
+) -> int:
+    """
+    Tiles of a row enclosed by the loop: crossing a loop tile that connects north
+    toggles between outside and inside.
+    """
+    inside = False
+    count = 0
+    for col, char in enumerate(line):
+        if loop_bits[col >> 3] >> (col & 7) & 1:
+            if char in north_pipes:
+                inside = not inside
+        elif inside:
+            count += 1
+    return count
+
+
+def play_game_scanline(puzzle: list[str]) -> int:
+    start = find_start(puzzle)
+    north_pipes = NORTH_PIPES
+    if (start[0] - 1, start[1]) in find_neighbours(puzzle, *start):
+        north_pipes += "S"
+    return sum(
+        count_row_interior(line, loop_bits, north_pipes)
+        for line, loop_bits in zip(puzzle, loop_bitmap(puzzle))
+    )
+
+
+START_SHAPES = {
+    frozenset({(-1, 0), (1, 0)}): "|",
+    frozenset({(0, -1), (0, 1)}): "-",
+    frozenset({(-1, 0), (0, 1)}): "L",
+    frozenset({(-1, 0), (0, -1)}): "J",
+    frozenset({(1, 0), (0, -1)}): "7",
+    frozenset({(1, 0), (0, 1)}): "F",
+}
+
+
+class LoopAnalysis(NamedTuple):
+    """
+    Everything known about the main loop after walking it once.
+
+    Tiles are numbered `row * nbr_cols + col`. `path` lists the loop tiles in
+    walking order starting from S, `bitmap` holds `row_size` bytes per row with
+    bit `col & 7` of byte `col >> 3` set on loop tiles, and `distances`
+    holds the steps along the loop from S, or -1 for tiles off the loop.
+    """
+
+    nbr_rows: int
+    nbr_cols: int
+    start_shape: str
+    path: array.array[int] | memoryview
+    bitmap: bytes
+    distances: array.array[int] | memoryview
+
+    @property
+    def row_size(self) -> int:
+        return (self.nbr_cols + 7) // 8
+
+    def row_bits(self, row: int) -> bytes:
+        start = row * self.row_size
+        return self.bitmap[start : start + self.row_size]
+
+
+def analyse_loop(puzzle: list[str]) -> LoopAnalysis:
+    nbr_rows, nbr_cols = len(puzzle), len(puzzle[0])
+    tiles = list(walk_loop(puzzle))
+    start_row, start_col = tiles[0]
+    start_shape = START_SHAPES[
+        frozenset(
+            (row - start_row, col - start_col) for row, col in (tiles[1], tiles[-1])
+        )
+    ]
+    path = array.array("q", (row * nbr_cols + col for row, col in tiles))
+    row_size = (nbr_cols + 7) // 8
+    bitmap = bytearray(nbr_rows * row_size)
+    distances = array.array("q", [-1]) * (nbr_rows * nbr_cols)
+    for step, (row, col) in enumerate(tiles):
+        bitmap[row * row_size + (col >> 3)] |= 1 << (col & 7)
+        distances[row * nbr_cols + col] = min(step, len(tiles) - step)
+    return LoopAnalysis(nbr_rows, nbr_cols, start_shape, path, bytes(bitmap), distances)
+
+
+LOOP_CACHE_MAGIC = b"DAY10LP1"
+# magic, number of rows, number of columns, length of the loop, shape of S
+LOOP_CACHE_HEADER = struct.Struct("<8sQQQQ")
+
+
+def loop_cache_file(puzzle: list[str], directory: pathlib.Path) -> pathlib.Path:
+    digest = hashlib.sha256("\n".join(puzzle).encode()).hexdigest()[:16]
+    return directory / f"loop-{digest}.bin"
+
+
+def save_loop_analysis(path: pathlib.Path, analysis: LoopAnalysis) -> None:
+    """
+    Store the analysis, the 8-byte arrays first so they stay aligned. Every
+    writer goes through its own temporary file.
+    """
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+    tmp_path = pathlib.Path(tmp_name)
+    with open(fd, "wb") as f:
+        f.write(
+            LOOP_CACHE_HEADER.pack(
+                LOOP_CACHE_MAGIC,
+                analysis.nbr_rows,
+                analysis.nbr_cols,
+                len(analysis.path),
+                ord(analysis.start_shape),
+            )
+        )
+        f.write(memoryview(analysis.path).cast("B"))
+        f.write(memoryview(analysis.distances).cast("B"))
+        f.write(analysis.bitmap)
+    tmp_path.replace(path)
+
+
+def read_loop_analysis(path: pathlib.Path) -> LoopAnalysis | None:
+    """
+    Map a saved analysis, or return None if it is missing, truncated or not a
+    loop analysis.
+    """
+    if not path.exists() or path.stat().st_size < LOOP_CACHE_HEADER.size:
+        return None
+    with path.open("rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, nbr_rows, nbr_cols, length, shape = LOOP_CACHE_HEADER.unpack_from(mapped)
+    expected_size = (
+        LOOP_CACHE_HEADER.size
+        + 8 * length
+        + 8 * nbr_rows * nbr_cols
+        + nbr_rows * ((nbr_cols + 7) // 8)
+    )
+    if (
+        magic != LOOP_CACHE_MAGIC
+        or len(mapped) != expected_size
+        or chr(shape) not in START_SHAPES.values()
+    ):
+        mapped.close()
+        return None
+    buffer = memoryview(mapped)
+    offset = LOOP_CACHE_HEADER.size
+    loop_path = buffer[offset : offset + 8 * length].cast("q")
+    offset += 8 * length
+    distances = buffer[offset : offset + 8 * nbr_rows * nbr_cols].cast("q")
+    offset += 8 * nbr_rows * nbr_cols
+    bitmap = bytes(buffer[offset : offset + nbr_rows * ((nbr_cols + 7) // 8)])
+    return LoopAnalysis(nbr_rows, nbr_cols, chr(shape), loop_path, bitmap, distances)
+
+
+def load_loop_analysis(
+    puzzle: list[str], directory: pathlib.Path = puzzle_file.parent
+) -> LoopAnalysis:
+    """
+    Loop analysis of the puzzle, cached on disk by the hash of its contents.
+    """
+    path = loop_cache_file(puzzle, directory)
+    analysis = read_loop_analysis(path)
+    if analysis is None:
+        save_loop_analysis(path, analyse_loop(puzzle))
+        analysis = read_loop_analysis(path)
+    if analysis is None:
+        raise RuntimeError(f"Could not load the loop analysis: {path}")
+    return analysis
+
+
+def play_game_analysis(
+    puzzle: list[str], directory: pathlib.Path = puzzle_file.parent
+) -> int:
+    analysis = load_loop_analysis(puzzle, directory)
+    return sum(
+        count_row_interior(
+            line.replace("S", analysis.start_shape), analysis.row_bits(row), NORTH_PIPES
+        )
+        for row, line in enumerate(puzzle)
+    )
+
+
+TILE_CONNECTIONS = {
+    ord(shape): tuple(offsets) for offsets, shape in START_SHAPES.items()
+}
+NORTH_BYTES = NORTH_PIPES.encode()
+
+
+class PipeMap:
+    """
+    Puzzle file mapped in memory, so that tiles are only read when asked for.
+    """
+
+    def __init__(self, path: pathlib.Path) -> None:
+        with path.open("rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        first_newline = self.data.find(b"\n")
+        self.nbr_cols = first_newline if first_newline >= 0 else len(self.data)
+        self.stride = self.nbr_cols + 1
+        self.nbr_rows = (len(self.data) + 1) // self.stride
+        start = self.data.find(b"S")
+        if start < 0:
+            raise RuntimeError("No start found")
+        self.start = divmod(start, self.stride)
+
+    def __getitem__(self, tile: tuple[int, int]) -> int:
+        row, col = tile
+        if 0 <= row < self.nbr_rows and 0 <= col < self.nbr_cols:
+            return self.data[row * self.stride + col]
+        return DOT
+
+    def start_shape(self) -> int:
+        row, col = self.start
+        offsets = frozenset(
+            (row_offset, col_offset)
+            for row_offset, col_offset in ((-1, 0), (1, 0), (0, -1), (0, 1))
+            if (-row_offset, -col_offset)
+            in TILE_CONNECTIONS.get(self[row + row_offset, col + col_offset], ())
+        )
+        return ord(START_SHAPES[offsets])
+
+
+def walk_pipe_map(pipe_map: PipeMap, start_shape: int) -> Iterator[tuple[int, int]]:
+    """
+    Tiles of the main loop in order, starting from S, reading only those tiles.
+    """
+    start = pipe_map.start
+    previous, current = start, start
+    while True:
+        yield current
+        row, col = current
+        char = start_shape if current == start else pipe_map[current]
+        following = [
+            (row + row_offset, col + col_offset)
+            for row_offset, col_offset in TILE_CONNECTIONS[char]
+            if (row + row_offset, col + col_offset) != previous
+        ]
+        previous, current = current, following[0]
+        if current == start:
+            return
+
+
+def spill_loop_tiles(
+    pipe_map: PipeMap,
+    start_shape: int,
+    block_rows: int,
+    block_cols: int,
+    directory: pathlib.Path,
+    buffer_size: int,
+) -> None:
+    """
+    Walk the loop once, appending the offset of every loop tile within its block
+    to the file `directory / f"{block}.bin"`, blocks being numbered row by row.
+    At most `buffer_size` offsets are held in memory between two flushes.
+    """
+    blocks_per_row = -(-pipe_map.nbr_cols // block_cols)
+    buffers: dict[int, array.array[int]] = collections.defaultdict(
+        lambda: array.array("q")
+    )
+    buffered = 0
+
+    def flush() -> None:
+        for block, offsets in buffers.items():
+            with (directory / f"{block}.bin").open("ab") as f:
+                offsets.tofile(f)
+        buffers.clear()
+
+    for row, col in walk_pipe_map(pipe_map, start_shape):
+        band, block_row = divmod(row, block_rows)
+        block_idx, block_col = divmod(col, block_cols)
+        nbr_cols = min(block_cols, pipe_map.nbr_cols - block_idx * block_cols)
+        buffers[band * blocks_per_row + block_idx].append(
+            block_row * nbr_cols + block_col
+        )
+        buffered += 1
+        if buffered >= buffer_size:
+            flush()
+            buffered = 0
+    flush()
+
+
+def read_loop_tiles(path: pathlib.Path, nbr_rows: int, nbr_cols: int) -> bytearray:
+    loop_tiles = bytearray(nbr_rows * nbr_cols)
+    if path.exists():
+        offsets = array.array("q")
+        offsets.frombytes(path.read_bytes())
+        for offset in offsets:
+            loop_tiles[offset] = 1
+    return loop_tiles
+
+
+def count_tile_interior(
+    pipe_map: PipeMap,
+    start_shape: int,
+    top: int,
+    left: int,
+    loop_tiles: bytearray,
+    nbr_cols: int,
+    inside: list[bool],
+) -> int:
+    """
+    Enclosed tiles of one block, `loop_tiles` flagging its loop tiles row by row.
+    `inside` holds, for every row of the block, whether its left edge is inside
+    the loop, and is updated to the right edge.
+    """
+    north_pipes = NORTH_BYTES + (b"S" if start_shape in NORTH_BYTES else b"")
+    count = 0
+    for row in range(len(inside)):
+        start = (top + row) * pipe_map.stride + left
+        line = pipe_map.data[start : start + nbr_cols]
+        for col, char in enumerate(line):
+            if loop_tiles[row * nbr_cols + col]:
+                if char in north_pipes:
+                    inside[row] = not inside[row]
+            elif inside[row]:
+                count += 1
+    return count
+
+
+def play_game_tiled(path: pathlib.Path, tile_budget: int = 1 << 20) -> int:
+    """
+    Scanline count over blocks of at most `tile_budget` tiles, so memory is
+    bounded by the budget rather than the size of the map. The loop is walked
+    once, spilling its tiles to one temporary file per block.
+    """
+    pipe_map = PipeMap(path)
+    start_shape = pipe_map.start_shape()
+    block_cols = min(pipe_map.nbr_cols, tile_budget)
+    block_rows = max(1, tile_budget // block_cols)
+    total = 0
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        directory = pathlib.Path(tmp_dir)
+        spill_loop_tiles(
+            pipe_map, start_shape, block_rows, block_cols, directory, tile_budget
+        )
+        block = 0
+        for top in range(0, pipe_map.nbr_rows, block_rows):
+            nbr_rows = min(block_rows, pipe_map.nbr_rows - top)
+            inside = [False] * nbr_rows
+            for left in range(0, pipe_map.nbr_cols, block_cols):
+                nbr_cols = min(block_cols, pipe_map.nbr_cols - left)
+                loop_tiles = read_loop_tiles(
+                    directory / f"{block}.bin", nbr_rows, nbr_cols
+                )
+                total += count_tile_interior(
+                    pipe_map, start_shape, top, left, loop_tiles, nbr_cols, inside
+                )
+                block += 1
+    return total
+
+
 def drop_non_main_loop(puzzle: list[str]) -> list[str]:
     loop_matrix = find_loop(puzzle)
     return [
@@ -484,6 +1064,99 @@ def test_game() -> None:
     )
 
 
+def test_walk_loop() -> None:
+    assert list(walk_loop([".....", ".S-7.", ".|.|.", ".L-J.", "....."])) == [
+        (1, 1),
+        (2, 1),
+        (3, 1),
+        (3, 2),
+        (3, 3),
+        (2, 3),
+        (1, 3),
+        (1, 2),
+    ]
+
+
+@pytest.mark.parametrize(
+    "puzzle,expected",
+    [
+        ([".....", ".S-7.", ".|.|.", ".L-J.", "....."], 1),
+        (["S---7", "|F-7|", "||.||", "|L-J|", "L---J"], 9),
+        (
+            [
+                "..........",
+                ".S------7.",
+                ".|F----7|.",
+                ".||....||.",
+                ".||....||.",
+                ".|L-7F-J|.",
+                ".|..||..|.",
+                ".L--JL--J.",
+                "..........",
+            ],
+            4,
+        ),
+        (
+            [
+                "FF7FSF7F7F7F7F7F---7",
+                "L|LJ||||||||||||F--J",
+                "FL-7LJLJ||||||LJL-77",
+                "F--JF--7||LJLJ7F7FJ-",
+                "L---JF-JLJ.||-FJLJJ7",
+                "|F|F-JF---7F7-L7L|7|",
+                "|FFJF7L7F-JF7|JL---7",
+                "7-L-JL7||F7|L7F-7F7|",
+                "L.L7LFJ|||||FJL7||LJ",
+                "L7JLJL-JLJLJL--JLJ.L",
+            ],
+            10,
+        ),
+    ],
+)
+def test_play_game_shoelace(puzzle: list[str], expected: int) -> None:
+    assert play_game_shoelace(puzzle) == expected
+
+
+def test_loop_bitmap() -> None:
+    assert loop_bitmap(["-L|F7", "7S-7|", "L|7||", "-L-J|", "L|-JF"]) == [
+        bytes([0b00000]),
+        bytes([0b01110]),
+        bytes([0b01010]),
+        bytes([0b01110]),
+        bytes([0b00000]),
+    ]
+
+
+def test_count_row_interior() -> None:
+    assert count_row_interior("|..|..|.|", bytes([0b01001001, 1]), NORTH_PIPES) == 3
+    assert count_row_interior("|.L-7.|", bytes([0b1011101]), NORTH_PIPES) == 1
+    assert count_row_interior("|.L-J.|", bytes([0b1011101]), NORTH_PIPES) == 2
+    assert count_row_interior("|.|.|", bytes([0b00101]), NORTH_PIPES) == 1
+
+
+@pytest.mark.parametrize(
+    "puzzle",
+    [
+        [".....", ".S-7.", ".|.|.", ".L-J.", "....."],
+        [".....", ".F-7.", ".|.|.", ".L-S.", "....."],
+        ["S---7", "|F-7|", "||.||", "|L-J|", "L---J"],
+        [
+            "..........",
+            ".S------7.",
+            ".|F----7|.",
+            ".||....||.",
+            ".||....||.",
+            ".|L-7F-J|.",
+            ".|..||..|.",
+            ".L--JL--J.",
+            "..........",
+        ],
+    ],
+)
+def test_play_game_scanline(puzzle: list[str]) -> None:
+    assert play_game_scanline(puzzle) == play_game_shoelace(puzzle)
+
+
 @pytest.mark.parametrize(
     "puzzle,expected",
     [
@@ -555,6 +1228,39 @@ def test_expand_puzzle(puzzle: list[str], expected: list[str]) -> None:
     assert expand_puzzle(puzzle) == expected
 
 
+@pytest.mark.parametrize(
+    "puzzle",
+    [["."], ["|"], ["-"], ["S"], ["-|"], ["F7", "LJ"], ["-L|F7", "7S-7|", "L|7||"]],
+)
+def test_expand_grid(puzzle: list[str]) -> None:
+    loop = Grid(len(puzzle), len(puzzle[0]))
+    loop.data = array.array("B", [1]) * len(loop.data)
+    assert expand_grid(puzzle, loop).to_lines() == expand_puzzle(puzzle)
+
+    loop[0, 0] = 0
+    dropped = ["." + puzzle[0][1:]] + puzzle[1:]
+    assert expand_grid(puzzle, loop).to_lines() == expand_puzzle(dropped)
+
+
+def test_grid() -> None:
+    grid = Grid.from_lines(["S-7", "|.|", "L-J"])
+    assert (grid.nbr_rows, grid.stride) == (3, 3)
+    assert grid[1, 1] == ord(".")
+    grid[1, 1] = ord("#")
+    assert grid.to_lines() == ["S-7", "|#|", "L-J"]
+
+
+def test_loop_mask() -> None:
+    mask = loop_mask(["-L|F7", "7S-7|", "L|7||", "-L-J|", "L|-JF"])
+    assert mask.to_lines() == [
+        "\x00\x00\x00\x00\x00",
+        "\x00\x01\x01\x01\x00",
+        "\x00\x01\x00\x01\x00",
+        "\x00\x01\x01\x01\x00",
+        "\x00\x00\x00\x00\x00",
+    ]
+
+
 @pytest.mark.parametrize(
     "puzzle,expected",
     [
@@ -655,9 +1361,210 @@ def test_color_and_drop_boundary_zones(
     assert drop_boundary_zones(color_puzzle(puzzle), puzzle) == expected
 
 
+@pytest.mark.parametrize(
+    "puzzle",
+    [
+        ["."],
+        ["..", ".."],
+        [".|.", "---", ".|."],
+        ["S-7", "|.|", "L-J"],
+        ["S.|-7", "|.|.|", "L-|-J"],
+        ["..|..", ".||.|", ".....", "|-|-.", ".|..."],
+        ["|.|.|", "|.|.|", "|...|"],
+    ],
+)
+def test_label_zones(puzzle: list[str]) -> None:
+    labels, sizes, on_border = label_zones(Grid.from_lines(puzzle))
+    zones = color_puzzle(puzzle)
+    center_zones = drop_boundary_zones(zones, puzzle)
+
+    assert sizes[1:] == [len(zone) for zone in zones]
+    assert [zone not in center_zones for zone in zones] == on_border[1:]
+    for label, zone in enumerate(zones, start=1):
+        for row, col in zone:
+            assert labels[row, col] == label
+
+
+def test_play_game_labels() -> None:
+    assert play_game_labels(["S---7", "|F-7|", "||.||", "|L-J|", "L---J"]) == 9
+    assert (
+        play_game_labels(
+            [
+                "..........",
+                ".S------7.",
+                ".|F----7|.",
+                ".||....||.",
+                ".||....||.",
+                ".|L-7F-J|.",
+                ".|..||..|.",
+                ".L--JL--J.",
+                "..........",
+            ]
+        )
+        == 4
+    )
+
+
+@pytest.mark.parametrize(
+    "puzzle",
+    [
+        ["."],
+        ["..", ".."],
+        [".|.", "---", ".|."],
+        ["S-7", "|.|", "L-J"],
+        ["S-|-7", "|.|.|", "L-|-J"],
+        ["S.|-7", "|.|.|", "L-|-J"],
+        ["..|..", ".||.|", ".....", "|-|-.", ".|..."],
+        ["-----", "|...|", "|.|.|", "-----"],
+    ],
+)
+def test_interior_tiles(puzzle: list[str]) -> None:
+    zones = drop_boundary_zones(color_puzzle(puzzle), puzzle)
+    assert interior_tiles(puzzle) == set().union(*zones)
+
+
+def test_play_game_exterior() -> None:
+    assert play_game_exterior(["S---7", "|F-7|", "||.||", "|L-J|", "L---J"]) == 9
+    assert (
+        play_game_exterior(
+            [
+                ".F----7F7F7F7F-7....",
+                ".|F--7||||||||FJ....",
+                ".||.FJ||||||||L7....",
+                "FJL7L7LJLJ||LJ.L-7..",
+                "L--J.L7...LJS7F-7L7.",
+                "....F-J..F7FJ|L7L7L7",
+                "....L7.F7||L7|.L7L7|",
+                ".....|FJLJ|FJ|F7|.LJ",
+                "....FJL-7.||.||||...",
+                "....L---J.LJ.LJLJ...",
+            ]
+        )
+        == 8
+    )
+
+
+def test_analyse_loop() -> None:
+    analysis = analyse_loop(["-L|F7", "7S-7|", "L|7||", "-L-J|", "L|-JF"])
+    assert analysis.start_shape == "F"
+    assert list(analysis.path) == [6, 11, 16, 17, 18, 13, 8, 7]
+    assert [analysis.row_bits(row) for row in range(5)] == loop_bitmap(
+        ["-L|F7", "7S-7|", "L|7||", "-L-J|", "L|-JF"]
+    )
+    assert max(analysis.distances) == 4
+    assert analyse_loop(["F7", "LS"]).start_shape == "J"
+
+
+def test_load_loop_analysis(tmp_path: pathlib.Path) -> None:
+    puzzle = ["S---7", "|F-7|", "||.||", "|L-J|", "L---J"]
+    analysis = analyse_loop(puzzle)
+    loaded = load_loop_analysis(puzzle, tmp_path)
+
+    assert loaded.start_shape == analysis.start_shape
+    assert list(loaded.path) == list(analysis.path)
+    assert loaded.bitmap == analysis.bitmap
+    assert list(loaded.distances) == list(analysis.distances)
+    assert [path.name for path in tmp_path.iterdir()] == [
+        loop_cache_file(puzzle, tmp_path).name
+    ]
+
+    path = loop_cache_file(puzzle, tmp_path)
+    path.write_bytes(path.read_bytes()[:-1])
+    assert read_loop_analysis(path) is None
+    assert load_loop_analysis(puzzle, tmp_path).bitmap == analysis.bitmap
+
+
+@pytest.mark.parametrize(
+    "puzzle",
+    [
+        [".....", ".S-7.", ".|.|.", ".L-J.", "....."],
+        [".....", ".F-7.", ".|.|.", ".L-S.", "....."],
+        ["S---7", "|F-7|", "||.||", "|L-J|", "L---J"],
+        [
+            "..........",
+            ".S------7.",
+            ".|F----7|.",
+            ".||....||.",
+            ".||....||.",
+            ".|L-7F-J|.",
+            ".|..||..|.",
+            ".L--JL--J.",
+            "..........",
+        ],
+    ],
+)
+def test_play_game_analysis(puzzle: list[str], tmp_path: pathlib.Path) -> None:
+    assert play_game_analysis(puzzle, tmp_path) == play_game_shoelace(puzzle)
+
+
+def test_pipe_map(tmp_path: pathlib.Path) -> None:
+    path = tmp_path / "puzzle.txt"
+    path.write_text("-L|F7\n7S-7|\nL|7||\n-L-J|\nL|-JF\n")
+    pipe_map = PipeMap(path)
+
+    assert (pipe_map.nbr_rows, pipe_map.nbr_cols) == (5, 5)
+    assert pipe_map.start == (1, 1)
+    assert chr(pipe_map.start_shape()) == "F"
+    assert pipe_map[2, 2] == ord("7")
+    assert pipe_map[-1, 2] == pipe_map[2, 5] == DOT
+    assert list(walk_pipe_map(pipe_map, pipe_map.start_shape())) == list(
+        walk_loop(["-L|F7", "7S-7|", "L|7||", "-L-J|", "L|-JF"])
+    )
+
+
+def test_spill_loop_tiles(tmp_path: pathlib.Path) -> None:
+    path = tmp_path / "puzzle.txt"
+    path.write_text("-L|F7\n7S-7|\nL|7||\n-L-J|\nL|-JF\n")
+    pipe_map = PipeMap(path)
+    spill_dir = tmp_path / "blocks"
+    spill_dir.mkdir()
+    spill_loop_tiles(pipe_map, pipe_map.start_shape(), 2, 3, spill_dir, 3)
+
+    assert sorted(spilled.name for spilled in spill_dir.iterdir()) == [
+        "0.bin",
+        "1.bin",
+        "2.bin",
+        "3.bin",
+    ]
+    assert read_loop_tiles(spill_dir / "0.bin", 2, 3) == bytes([0, 0, 0, 0, 1, 1])
+    assert read_loop_tiles(spill_dir / "1.bin", 2, 2) == bytes([0, 0, 1, 0])
+    assert read_loop_tiles(spill_dir / "2.bin", 2, 3) == bytes([0, 1, 0, 0, 1, 1])
+    assert read_loop_tiles(spill_dir / "3.bin", 2, 2) == bytes([1, 0, 1, 0])
+    assert read_loop_tiles(spill_dir / "4.bin", 1, 3) == bytes(3)
+
+
+@pytest.mark.parametrize("tile_budget", [1, 3, 7, 30, 1 << 20])
+@pytest.mark.parametrize(
+    "puzzle",
+    [
+        [".....", ".S-7.", ".|.|.", ".L-J.", "....."],
+        [".....", ".F-7.", ".|.|.", ".L-S.", "....."],
+        ["S---7", "|F-7|", "||.||", "|L-J|", "L---J"],
+        [
+            "FF7FSF7F7F7F7F7F---7",
+            "L|LJ||||||||||||F--J",
+            "FL-7LJLJ||||||LJL-77",
+            "F--JF--7||LJLJ7F7FJ-",
+            "L---JF-JLJ.||-FJLJJ7",
+            "|F|F-JF---7F7-L7L|7|",
+            "|FFJF7L7F-JF7|JL---7",
+            "7-L-JL7||F7|L7F-7F7|",
+            "L.L7LFJ|||||FJL7||LJ",
+            "L7JLJL-JLJLJL--JLJ.L",
+        ],
+    ],
+)
+def test_play_game_tiled(
+    puzzle: list[str], tile_budget: int, tmp_path: pathlib.Path
+) -> None:
+    path = tmp_path / "puzzle.txt"
+    path.write_text("\n".join(puzzle))
+    assert play_game_tiled(path, tile_budget) == play_game_shoelace(puzzle)
+
+
 def main() -> None:
     puzzle = puzzle_file.read_text().splitlines()
-    print(play_game(puzzle))
+    print(play_game_analysis(puzzle))
 
 
 if __name__ == "__main__":
@@ -11,6 +11,8 @@ import itertools
 import pathlib
 from typing import Iterator
 
+import pytest
+
 
 puzzle_file = pathlib.Path(__file__).parent / "puzzle.txt"
 
@@ -88,6 +90,35 @@ def play_game(puzzle: list[str], multiplier: int) -> int:
     )
 
 
+def empty_prefix(lines: list[str]) -> list[int]:
+    """
+    Number of lines without galaxies before every line.
+    """
+    prefix = [0]
+    for line in lines:
+        prefix.append(prefix[-1] + ("#" not in line))
+    return prefix
+
+
+def sum_pairwise_distances(values: list[int]) -> int:
+    """
+    Sum of |a - b| over all pairs of sorted values: the value at position idx
+    is added once for each of the idx values before it and subtracted once for
+    each value after it.
+    """
+    return sum(value * (2 * idx - len(values) + 1) for idx, value in enumerate(values))
+
+
+def play_game_prefix(puzzle: list[str], multiplier: int) -> int:
+    empty_rows = empty_prefix(puzzle)
+    empty_cols = empty_prefix(transpose(puzzle))
+    galaxies = list(find_galaxies(puzzle))
+    # galaxies are found row by row, so their rows are already sorted
+    rows = [row + empty_rows[row] * (multiplier - 1) for row, _ in galaxies]
+    cols = sorted(col + empty_cols[col] * (multiplier - 1) for _, col in galaxies)
+    return sum_pairwise_distances(rows) + sum_pairwise_distances(cols)
+
+
 def test_expand() -> None:
     puzzle = [
         "...#......",
@@ -174,9 +205,25 @@ def test_play_game() -> None:
     assert play_game(EXAMPLE, 100) == 8410
 
 
+def test_empty_prefix() -> None:
+    assert empty_prefix(EXAMPLE) == [0, 0, 0, 0, 1, 1, 1, 1, 2, 2, 2]
+    assert empty_prefix(transpose(EXAMPLE))[-1] == 3
+
+
+def test_sum_pairwise_distances() -> None:
+    assert sum_pairwise_distances([]) == 0
+    assert sum_pairwise_distances([4]) == 0
+    assert sum_pairwise_distances([1, 3, 3, 10]) == 2 + 2 + 9 + 0 + 7 + 7
+
+
+@pytest.mark.parametrize("multiplier", [1, 2, 10, 100, 1000000])
+def test_play_game_prefix(multiplier: int) -> None:
+    assert play_game_prefix(EXAMPLE, multiplier) == play_game(EXAMPLE, multiplier)
+
+
 def main() -> None:
     puzzle = puzzle_file.read_text().splitlines()
-    print(play_game(puzzle, 1000000))
+    print(play_game_prefix(puzzle, 1000000))
 
 
 if __name__ == "__main__":